@@ -0,0 +1,137 @@
+# パイプラインの各段のスループットを計測する。
+# 実機は不要で、stream_generatorで生成したバイト列を入力する。
+#
+# 実行例（リポジトリのルートで実行する）:
+# python -m benchmark.run_benchmark --format float float float float --samples 100000
+
+import argparse
+import time
+import tracemalloc
+from typing import Callable
+from benchmark.stream_generator import generate_stream
+from serial_processor.serial_byte2data import VariousDataEndian, SerialByte2Data
+from serial_processor.serial_decoder import SerialDecoder
+from serial_processor.serial_raw2array_pipeline import SerialRaw2ArrayPipeline
+from serial_processor.serial_raw2text_pipeline import SerialRaw2TextPipeline
+
+# int(0~255) -> 1バイトのbytesへの変換表（1バイト毎の計測でbytesの生成時間を含めないようにする）
+BYTE_TABLE: list[bytes] = [bytes((i,)) for i in range(256)]
+
+
+def iter_chunks(stream: bytes, chunk_size: int) -> list[memoryview]:
+    view = memoryview(stream)
+    return [view[i:i + chunk_size] for i in range(0, len(stream), chunk_size)]
+
+
+def measure(name: str, run: Callable[[], object], byte_count: int, sample_count: int, repeat: int) -> dict:
+    '''
+    runをrepeat回実行した最短時間と、1回実行した時のピークメモリを計測する。
+    '''
+    best = float("inf")
+    for i in range(0, repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "stage": name,
+        "seconds": best,
+        "bytes_per_s": byte_count / best,
+        "samples_per_s": sample_count / best,
+        "peak_bytes": peak,
+    }
+
+
+def run_benchmark(data_format_list: list[str], endian: VariousDataEndian, sample_count: int,
+                  chunk_size: int, repeat: int, junk_rate: float, corrupt_rate: float,
+                  per_byte: bool, checksum: str | None = None) -> list[dict]:
+    stream, values = generate_stream(data_format_list, sample_count, endian=endian,
+                                     junk_rate=junk_rate, corrupt_rate=corrupt_rate, checksum=checksum)
+    chunks = iter_chunks(stream, chunk_size)
+    frames = SerialDecoder().decode_buffer(stream)
+    payload = SerialByte2Data(data_format_list, endian, checksum=checksum).join_frames(frames)
+    frame_bytes = len(payload)
+    results: list[dict] = []
+
+    # 制御文字の処理
+    def decode_buffer():
+        decoder = SerialDecoder()
+        for c in chunks:
+            decoder.decode_buffer(c)
+    results.append(measure("decoder.decode_buffer", decode_buffer, len(stream), sample_count, repeat))
+
+    # バイト列からデータへの変換
+    def unpack_frames():
+        SerialByte2Data(data_format_list, endian, checksum=checksum).unpack_frames(payload)
+    results.append(measure("byte2data.unpack_frames", unpack_frames, frame_bytes, sample_count, repeat))
+
+    def frames2array():
+        SerialByte2Data(data_format_list, endian, checksum=checksum).frames2array(payload).copy()
+    results.append(measure("byte2data.frames2array", frames2array, frame_bytes, sample_count, repeat))
+
+    # 全体
+    def text_pipeline():
+        pipeline = SerialRaw2TextPipeline(data_format_list, endian=endian, checksum=checksum)
+        for c in chunks:
+            pipeline.read_chunk(c)
+    results.append(measure("raw2text.read_chunk", text_pipeline, len(stream), sample_count, repeat))
+
+    def array_pipeline():
+        pipeline = SerialRaw2ArrayPipeline(data_format_list, endian=endian, checksum=checksum)
+        for c in chunks:
+            pipeline.read_chunk_array(c)
+    results.append(measure("raw2array.read_chunk_array", array_pipeline, len(stream), sample_count, repeat))
+
+    if per_byte:
+        # 1バイトずつ処理する従来の経路（遅いため、指定された場合のみ計測する）
+        def decode():
+            decoder = SerialDecoder()
+            for i in stream:
+                decoder.decode(BYTE_TABLE[i])
+        results.append(measure("decoder.decode", decode, len(stream), sample_count, 1))
+
+        def byte2data_per_byte():
+            b2d = SerialByte2Data(data_format_list, endian, checksum=checksum)
+            for f in frames:
+                b2d.reset_translate()
+                for i in f:
+                    b2d.byte2data(BYTE_TABLE[i])
+        results.append(measure("byte2data.byte2data", byte2data_per_byte, frame_bytes, sample_count, 1))
+
+        def text_per_byte():
+            pipeline = SerialRaw2TextPipeline(data_format_list, endian=endian, checksum=checksum)
+            for i in stream:
+                pipeline.read_byte(BYTE_TABLE[i])
+        results.append(measure("raw2text.read_byte", text_per_byte, len(stream), sample_count, 1))
+
+    return results
+
+
+def print_results(results: list[dict]) -> None:
+    print("{:<28} {:>10} {:>12} {:>14} {:>12}".format("stage", "time[ms]", "MB/s", "samples/s", "peak[KiB]"))
+    for r in results:
+        print("{:<28} {:>10.2f} {:>12.2f} {:>14.0f} {:>12.1f}".format(
+            r["stage"], r["seconds"] * 1000, r["bytes_per_s"] / 1e6, r["samples_per_s"], r["peak_bytes"] / 1024))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the serial decode pipeline with a synthetic stream.")
+    parser.add_argument("--format", nargs="+", default=["float", "float", "float", "float"],
+                        help="data_format_list (e.g. uint16 float fp16q15)")
+    parser.add_argument("--endian", choices=["big", "little"], default="little")
+    parser.add_argument("--samples", type=int, default=100000)
+    parser.add_argument("--chunk-size", type=int, default=4096)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--junk-rate", type=float, default=0.0)
+    parser.add_argument("--corrupt-rate", type=float, default=0.0)
+    parser.add_argument("--checksum", choices=["sum8", "xor8", "crc16", "crc32"], default=None)
+    parser.add_argument("--per-byte", action="store_true", help="also measure the byte-at-a-time path")
+    args = parser.parse_args()
+
+    endian = VariousDataEndian.BIGENDIAN if args.endian == "big" else VariousDataEndian.LITTLEENDIAN
+    print_results(run_benchmark(args.format, endian, args.samples, args.chunk_size, args.repeat,
+                                args.junk_rate, args.corrupt_rate, args.per_byte, args.checksum))
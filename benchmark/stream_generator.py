@@ -0,0 +1,121 @@
+import numpy as np
+from serial_processor.frame_checksum import compute_checksum
+from serial_processor.serial_byte2data import VariousDataEndian, VariousDataType, VariousData, SerialByte2Data, \
+    endian_byteorder, endian_prefix
+
+
+def generate_values(data_format_list: list[str], sample_count: int, rng: np.random.Generator,
+                    noise: float = 0.1) -> np.ndarray:
+    '''
+    data_format_listの各列に、正弦波に雑音を加えた値を生成する。
+    戻り値はフィールド"f0", "f1", ...を持つネイティブのバイトオーダーの構造化配列。
+    '''
+    byte2data = SerialByte2Data(data_format_list, VariousDataEndian.LITTLEENDIAN)
+    dtype_list = byte2data.column_dtype_list()
+    values = np.empty(sample_count, dtype=[("f{}".format(i), dt) for i, dt in enumerate(dtype_list)])
+    t = np.arange(sample_count)
+    for i, dt in enumerate(dtype_list):
+        wave = np.sin(2 * np.pi * t / (50 + 10 * i)) + rng.normal(0, noise, sample_count)
+        vd = byte2data.data_array[i]
+        if vd.type_format == VariousDataType.FP:
+            # 固定小数点型の範囲の半分程度の振幅にする
+            full_scale = 2.0 ** (vd.fp_word - vd.fp_fraction - (1 if vd.fp_signed else 0))
+            center = 0.0 if vd.fp_signed else full_scale / 2
+            values["f{}".format(i)] = center + wave * full_scale / 4
+        elif dt.kind == "f":
+            values["f{}".format(i)] = wave * 100
+        else:
+            info = np.iinfo(dt)
+            # 型の範囲の半分程度の振幅にする
+            center = (int(info.max) + int(info.min)) / 2
+            amplitude = (int(info.max) - int(info.min)) / 4
+            values["f{}".format(i)] = np.clip(center + wave * amplitude, info.min, info.max).astype(dt)
+    return values
+
+
+def encode_frames(data_format_list: list[str], values: np.ndarray, endian: VariousDataEndian,
+                  dle: bytes = b"\x10", stx: bytes = b"\x02", etx: bytes = b"\x03",
+                  checksum: str | None = None) -> list[bytes]:
+    '''
+    値を1サンプル毎にバイト列に変換し、DLEをエスケープして[DLE, STX]と[DLE, ETX]で囲んだフレームの配列を返す。
+    checksumを指定した場合はデータ列の後ろにチェックサムを付加する。
+    '''
+    byte2data = SerialByte2Data(data_format_list, endian)
+    prefix = endian_prefix(endian)
+    columns: list[np.ndarray] = []
+    for i, vd in enumerate(byte2data.data_array):
+        column = values["f{}".format(i)]
+        if vd.type_format == VariousDataType.FP:
+            columns.append(encode_fixed_point(column, vd))
+        else:
+            raw = np.ascontiguousarray(column, dtype=prefix + vd.numpy_format)
+            columns.append(raw.view(np.uint8).reshape(len(column), vd.bytes_length))
+    payload = np.hstack(columns).tobytes()
+    size = byte2data.frame_size
+    start = dle + stx
+    end = dle + etx
+    escaped_dle = dle + dle
+    frames = [payload[i:i + size] for i in range(0, len(payload), size)]
+    if checksum != None:
+        trailer_size = SerialByte2Data(data_format_list, endian, checksum=checksum).checksum_size
+        byteorder = endian_byteorder(endian)
+        frames = [f + compute_checksum(checksum, f).to_bytes(trailer_size, byteorder) for f in frames]
+    return [start + f.replace(dle, escaped_dle) + end for f in frames]
+
+
+def encode_fixed_point(column: np.ndarray, vd: VariousData) -> np.ndarray:
+    '''
+    値を固定小数点型に変換し、形状(サンプル数, バイト数)のバイト列として返す。
+    '''
+    raw = np.round(column * 2.0 ** vd.fp_fraction)
+    if vd.fp_signed:
+        raw = np.clip(raw, -2.0 ** (vd.fp_word - 1), 2.0 ** (vd.fp_word - 1) - 1).astype(np.int64).view(np.uint64)
+    else:
+        raw = np.clip(raw, 0, 2.0 ** vd.fp_word - 1).astype(np.uint64)
+    if vd.fp_word < 64:
+        raw &= np.uint64((1 << vd.fp_word) - 1)
+    # 8バイトの整数から、値を格納するバイト数分の下位バイトを取り出す
+    raw_bytes = raw.astype(">u8").view(np.uint8).reshape(len(column), 8)[:, 8 - vd.bytes_length:]
+    if vd.endian == VariousDataEndian.LITTLEENDIAN:
+        raw_bytes = raw_bytes[:, ::-1]
+    return raw_bytes
+
+
+def generate_stream(data_format_list: list[str], sample_count: int,
+                    endian: VariousDataEndian = VariousDataEndian.BIGENDIAN,
+                    dle: bytes = b"\x10", stx: bytes = b"\x02", etx: bytes = b"\x03",
+                    noise: float = 0.1, corrupt_rate: float = 0.0,
+                    junk_rate: float = 0.0, junk_max: int = 8, seed: int = 0,
+                    checksum: str | None = None) -> tuple[bytes, np.ndarray]:
+    '''
+    シリアル通信で受信するバイト列を模擬して生成する。
+
+    引数:
+
+    * data_format_list/endian/dle/stx/etx 生成するフレームの定義。
+    * sample_count 生成するサンプル数。
+    * noise 値に加える雑音の標準偏差（正弦波の振幅に対する割合）。
+    * corrupt_rate フレーム内の1バイトを書き換える確率（フレーム毎）。
+    * junk_rate フレームの間にランダムなバイト列を挟む確率（フレーム毎）。
+    * junk_max 挟むバイト列の最大長。
+    * seed 乱数のシード。
+    * checksum 各フレームに付加するチェックサムの種類。
+
+    戻り値は（バイト列, 生成した値の構造化配列）。
+    '''
+    rng = np.random.default_rng(seed)
+    values = generate_values(data_format_list, sample_count, rng, noise=noise)
+    frames = encode_frames(data_format_list, values, endian, dle=dle, stx=stx, etx=etx, checksum=checksum)
+
+    corrupt = rng.random(sample_count) < corrupt_rate
+    junk = rng.random(sample_count) < junk_rate
+    parts: list[bytes] = []
+    for i, frame in enumerate(frames):
+        if corrupt[i]:
+            b = bytearray(frame)
+            b[rng.integers(0, len(b))] = rng.integers(0, 256)
+            frame = bytes(b)
+        parts.append(frame)
+        if junk[i]:
+            parts.append(rng.integers(0, 256, rng.integers(1, junk_max + 1), dtype=np.uint8).tobytes())
+    return b"".join(parts), values
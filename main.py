@@ -1,85 +1,380 @@
 # プログラムのエントリポイント
 # コマンドによって各モジュールを制御する。
 
+from serial_acquisition.multi_port_acquisition import MultiPortAcquisition, SerialPortConfig
+from serial_acquisition.serial_acquisition import SerialAcquisition
+from serial_analysis.derived_channels import DerivedChannels
+from serial_analysis.stft_engine import StftEngine
+from serial_analysis.trigger_engine import Capture, TriggerEdge, TriggerEngine
+from serial_processor.pipeline_stats import PipelineStats
 from serial_processor.serial_byte2data import VariousDataEndian
-from serial_processor.serial_raw2text_pipeline import SerialRaw2TextPipeline
+from serial_processor.serial_raw2array_pipeline import SerialRaw2ArrayPipeline
+from serial_processor.serial_text2array_pipeline import SerialText2ArrayPipeline
+from serial_plotter.decimator import EnvelopeDecimator, lttb
+from serial_plotter.plot_renderer import PlotRenderer
+from serial_plotter.ring_buffer import RingBuffer
+from serial_plotter.x_axis import MonotonicXIndex, XAxisMode, XAxisSelector
 from serial_reader.serial_reader import SerialReader
+from serial_recorder.column_store import ColumnWriter
+from serial_recorder.raw_recorder import RawRecorder, RawReplaySource
+from serial_server.stream_client import SampleStreamClient
+from serial_server.stream_server import SampleStreamServer
+import asyncio
 import matplotlib.pyplot as plt
+import numpy as np
+import sys
+import time
 
 
+# 受信モード "bin"（バイナリ）/"text"（Arduinoのように区切り文字と改行で送られてくるテキスト）
 mode: str = "bin"
 serial_port: str = "COM3"
 serial_baudrate: int = 115200
+# 複数のポートで同時に受信する場合はポートを列挙する（空の場合はserial_portのみで受信する）
+# ポート毎に別プロセスで受信・デコードし、受信時刻を横軸として表示する。
+serial_port_list: list[str] = []
 byte_order = VariousDataEndian.LITTLEENDIAN
 data_format = ["float", "float", "float", "float"]
 delimiter: str = ","
+# フレームのデータ列の後ろに付加されたチェックサム "sum8"/"xor8"/"crc16"/"crc32"/None（無し）
+frame_checksum: str | None = None
+# 受信した生データの記録先（Noneの場合は記録しない）
+# 複数ポートの場合は、ポート毎に".port0", ".port1", ...を付けたファイルに記録する
+record_path: str | None = None
+# デコード済みのサンプルを列毎に元の型のまま書き出すディレクトリ（Noneの場合は書き出さない）
+# 受信時刻を列"time"として書き出す（複数ポートの場合は、ポート毎のサブディレクトリport0, port1, ...に書き出す）
+export_path: str | None = None
+# 記録した生データを再生する場合はファイルを指定する（シリアルポートの代わりに入力元とする）
+replay_path: str | None = None
 t: str | None = ""
+# 描画の目標フレームレート[Hz]。受信とデコードは別スレッドで行う。
+target_fps: float = 30.0
+# 表示用に保持するサンプル数（複数ポートの場合はポート毎）
+view_length: int = 10000
+# 描画前の間引き方法 "envelope"（画素毎の最小値・最大値）/"lttb"/None（間引かない）
+# 表示するサンプル数がグラフの横幅の画素数を超える場合に間引く
+decimation: str | None = "envelope"
+# 横軸 FIELD（x_field番目のデータ列）/SAMPLE_COUNT（サンプルの通し番号）/HOST_TIME（受信時刻）
+# 複数ポートで受信する場合は常に受信時刻とする。
+x_axis = XAxisMode.FIELD
+x_field: int = 0
+# 横軸のデータ列が周期的に0に戻るカウンタの場合のビット数（例: uint16のティックなら16、Noneの場合は補正しない）
+x_wrap_bits: int | None = None
+# 横軸の値に掛ける係数（ティックを秒に変換する場合など）
+x_scale: float = 1.0
+# 表示する横軸の幅（Noneの場合はリングバッファに保持している全てのサンプルを表示する）
+x_window: float | None = None
+# スペクトルを表示するデータ列のインデックス（Noneの場合は表示しない）
+fft_column: int | None = None
+fft_window_size: int = 1024
+fft_hop: int = 256
+fft_window: str = "hann"
+# サンプリング周波数[Hz]（スペクトルの周波数軸に用いる）
+fft_sample_rate: float = 1.0
+# 派生データ列の定義 "名前 = 式"（データ列はf0, f1, ...で参照する。serial_analysis/derived_channels.pyを参照）
+# 例: ["norm = sqrt(f0^2 + f1^2)", "f0_avg = mavg(f0, 32)", "f0_rms = rms(f0, 256)", "f0_d = diff(f0)"]
+derived_channel_list: list[str] = []
+# トリガーを掛けるデータ列のインデックス（Noneの場合はトリガーを使わずに流れるように表示する。派生データ列も指定できる）
+# トリガーを使う場合は、トリガーの前後を切り出したサンプルのみを表示・書き出す
+# （書き出したファイルはtrigger_pre_samples + trigger_post_samples行毎に1回分の切り出し）
+trigger_field: int | None = None
+trigger_level: float = 0.0
+trigger_edge = TriggerEdge.RISING
+trigger_hysteresis: float = 0.0
+# トリガーしてから次のトリガーを受け付けるまでのサンプル数
+trigger_holdoff: int = 0
+trigger_pre_samples: int = 100
+trigger_post_samples: int = 400
+# Trueの場合は1回切り出した後は停止する
+trigger_single: bool = False
+# 受信・デコード・描画の各段の計測値を1秒毎に標準出力に表示する
+print_stats: bool = False
+# ヘッドレスモード: 描画せずに、デコード済みのサンプルを指定したアドレスで配信する（Noneの場合は描画する）
+# "unix:/tmp/serial_plotter.sock"（Unixドメインソケット）/"127.0.0.1:5555"（TCP）
+serve_address: str | None = None
+# シリアルポートの代わりに、別のプロセスのヘッドレスモードから配信されたサンプルを受信して描画する
+connect_address: str | None = None
 
 if __name__ == "__main__":
-    serial_reader = SerialReader(serial_port, serial_baudrate, 1.0)
-    raw2text = SerialRaw2TextPipeline(data_format, endian=byte_order)
+    if serve_address != None and len(serial_port_list) > 0:
+        print("Headless mode does not support multiple ports.", file=sys.stderr)
+        sys.exit(1)
+    if trigger_field != None and len(serial_port_list) > 0:
+        print("Trigger mode does not support multiple ports.", file=sys.stderr)
+        sys.exit(1)
+    if replay_path != None and len(serial_port_list) > 0:
+        print("Replay does not support multiple ports.", file=sys.stderr)
+        sys.exit(1)
+    if len(derived_channel_list) > 0 and connect_address != None:
+        print("Derived channels are evaluated by the serving process.", file=sys.stderr)
+        sys.exit(1)
+    # トリガーを使う場合は切り出したサンプルのみを、配信されたサンプルを受信する場合は受け取ったサンプルを描画側で書き出す
+    export_in_plot: bool = export_path != None and len(serial_port_list) == 0 and (
+        (trigger_field != None and serve_address == None) or connect_address != None)
+    # 配信する場合と、描画側で受信時刻とともに書き出す場合は常に受信時刻を加える
+    timestamp: bool = x_axis == XAxisMode.HOST_TIME or serve_address != None or export_in_plot
+    multi_port: MultiPortAcquisition | None = None
+    recorder: RawRecorder | None = None
+    # 派生データ列は受信側でデータ列の後ろに加え、データ列と同じく描画、配信、書き出しする
+    # （複数ポートの場合は、ワーカープロセスでポート毎に加える）
+    derived: DerivedChannels | None = None
+    if len(serial_port_list) > 0:
+        multi_port = MultiPortAcquisition(
+            [SerialPortConfig(port, serial_baudrate, data_format, endian=byte_order, mode=mode, delimiter=delimiter,
+                              checksum=frame_checksum)
+             for port in serial_port_list], derived_channel_list=derived_channel_list, export_path=export_path,
+            record_path=record_path)
+    elif connect_address != None:
+        acquisition = SampleStreamClient(connect_address, keep_time=timestamp)
+        data_format = acquisition.data_format
+    else:
+        if replay_path != None:
+            source = RawReplaySource(replay_path)
+            data_format = source.data_format
+            mode = source.mode
+            raw2array = source.make_pipeline()
+        else:
+            source = SerialReader(serial_port, serial_baudrate, 1.0)
+            if mode == "bin":
+                raw2array = SerialRaw2ArrayPipeline(data_format, endian=byte_order, checksum=frame_checksum)
+            else:
+                # テキストモードではdata_formatは列数のみに用いる
+                raw2array = SerialText2ArrayPipeline(len(data_format), delimiter=delimiter)
+            if record_path != None:
+                recorder = RawRecorder(record_path, data_format, endian=byte_order, mode=mode, delimiter=delimiter,
+                                       checksum=frame_checksum)
+        if len(derived_channel_list) > 0:
+            derived = DerivedChannels(derived_channel_list, ["f{}".format(i) for i in range(0, len(data_format))])
+    if connect_address != None:
+        # 配信側で加えた派生データ列も、データ列として受け取る
+        column_names: list[str] = [name for name in acquisition.column_names if name != "time"]
+    else:
+        column_names = ["f{}".format(i) for i in range(0, len(data_format))]
+        if len(derived_channel_list) > 0:
+            # 複数ポートの場合も、ワーカープロセスを起動する前に定義を検証する
+            column_names = column_names + (
+                derived if derived != None else DerivedChannels(derived_channel_list, column_names)).names
+    # テキストモードではdata_formatの型に関わらず、変換したfloat64のまま書き出す
+    value_format: list[str] = data_format if mode == "bin" else ["double"] * len(data_format)
+    column_format: list[str] = value_format + ["double"] * (len(column_names) - len(data_format))
+    # 書き出しは受信側で、描画用のキューに入れる前に元の型のまま行う（複数ポートの場合はワーカープロセスで行う）
+    # 先頭の列には受信時刻を書き出す
+    column_writer: ColumnWriter | None = None
+    if export_path != None and multi_port == None:
+        column_writer = ColumnWriter(export_path, ["double"] + column_format, column_names=["time"] + column_names)
+    if multi_port == None and connect_address == None:
+        # 記録ファイルの再生はサンプルを破棄せず、ファイルを読み込んだ時刻を受信時刻とする
+        acquisition = SerialAcquisition(source, raw2array, recorder=recorder, drop_when_full=replay_path == None,
+                                        timestamp=timestamp, baudrate=serial_baudrate if replay_path == None else 0,
+                                        derived=derived, exporter=None if export_in_plot else column_writer)
+    # 各段の計測値をまとめる
+    pipeline_stats = PipelineStats()
+    if multi_port != None:
+        pipeline_stats.add("acquisition", multi_port)
+    else:
+        if replay_path == None and connect_address == None:
+            pipeline_stats.add("reader", source)
+        if connect_address == None:
+            pipeline_stats.add("pipeline", raw2array)
+        pipeline_stats.add("acquisition", acquisition)
+    if derived != None:
+        pipeline_stats.add("derived", derived)
+
+    if serve_address != None:
+        # ヘッドレスモード: 受信時刻とデータ列を配信し、描画はクライアントに任せる
+        server = SampleStreamServer(acquisition, serve_address, ["time"] + column_names, column_format)
+        pipeline_stats.add("server", server)
+        acquisition.start()
+        try:
+            asyncio.run(server.serve(report=(lambda: print(pipeline_stats.format_line())) if print_stats else None))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            acquisition.stop()
+            if recorder != None:
+                recorder.close()
+            if column_writer != None:
+                column_writer.close()
+        sys.exit(0)
+
+    start_time: float = time.time()
+    if multi_port != None:
+        multi_port.start()
+    else:
+        acquisition.start()
 
     # プロット用変数
-    fig, ax = plt.subplots(1, 1)
+    stft: StftEngine | None = None
+    if fft_column != None:
+        fig, (ax, fft_ax) = plt.subplots(2, 1)
+        stft = StftEngine(fft_window_size, fft_hop, fft_window, sample_rate=fft_sample_rate)
+        fft_freqs = stft.freqs()
+    else:
+        fig, ax = plt.subplots(1, 1)
+    # 描画側で受け取ったサンプルの総数（ウィンドウタイトルに表示する）
     data_count: int = 0
-    col_count: int = len(data_format)
-    xline: list[int] = [0]
-    line_array: list[plt.Line2D] = []
-    view_length: int = 100
-    data_array: list[list[float]] = [
-        [0 for j in range(0, view_length)] for i in range(0, col_count)]
+    col_count: int = len(column_names)
+    # 表示するサンプルを[横軸, データ列...]として保持するリングバッファ（複数ポートの場合はポート毎）
+    ring_buffers: list[RingBuffer] = []
+    # 線として表示するリングバッファの列
+    line_columns: list[int] = list(range(1, col_count + 1))
+    x_selector = XAxisSelector(x_axis, field_index=x_field, wrap_bits=x_wrap_bits, scale=x_scale)
+    if multi_port != None:
+        ring_buffers = [RingBuffer(view_length, col_count + 1) for port in serial_port_list]
+    else:
+        ring_buffers = [RingBuffer(view_length, col_count + 1)]
+        if x_axis == XAxisMode.FIELD:
+            # 横軸としたデータ列は線として表示しない
+            line_columns.remove(x_field + 1)
+    x_indexes = [MonotonicXIndex(rb) for rb in ring_buffers]
+    line_count: int = len(line_columns) * len(ring_buffers)
+    renderer = PlotRenderer(fig, ax, line_count, target_fps=target_fps)
+    pipeline_stats.add("render", renderer)
+    if stft != None:
+        fft_renderer = PlotRenderer(fig, fft_ax, 1, target_fps=target_fps)
+        pipeline_stats.add("fft", stft)
+    # 前回のフレームから受信したスペクトル解析対象のサンプル
+    fft_samples: list = []
+    stats_time: float = time.perf_counter()
+    plt.show(block=False)
+    pixel_count: int = int(ax.get_window_extent().width)
+    decimators = [EnvelopeDecimator(view_length, len(line_columns), pixel_count) for rb in ring_buffers]
+    # トリガー（リングバッファと同じく[横軸, データ列...]を入力する）
+    trigger: TriggerEngine | None = None
+    latest_capture: Capture | None = None
+    if trigger_field != None:
+        trigger = TriggerEngine(col_count + 2 if export_in_plot else col_count + 1, trigger_field + 1, trigger_level, edge=trigger_edge,
+                                hysteresis=trigger_hysteresis, holdoff=trigger_holdoff,
+                                pre_samples=trigger_pre_samples, post_samples=trigger_post_samples,
+                                single=trigger_single)
+        pipeline_stats.add("trigger", trigger)
 
-    while True:
-        data_line: str = ""
+    # ウィンドウを閉じるまで描画し、終了時に受信を止めて書き出し途中のファイルを閉じる
+    try:
+        while plt.fignum_exists(fig.number):
+            # 受信スレッドが前回のフレームから溜めたサンプルをまとめて取り出す
+            received: bool = False
+            if multi_port != None:
+                merged = multi_port.merge()
+                if len(merged) > 0:
+                    merged[:, 0] -= start_time
+                    for i, rb in enumerate(ring_buffers):
+                        port_rows = merged[merged[:, 1] == i]
+                        rb.extend(port_rows[:, [0] + list(range(2, col_count + 2))])
+                        if stft != None and i == 0:
+                            # 複数ポートの場合は最初のポートを解析する
+                            fft_samples.append(port_rows[:, fft_column + 2])
+                    data_count += len(merged)
+                    received = True
+            else:
+                for batch in acquisition.drain():
+                    times: np.ndarray | None = None
+                    if timestamp:
+                        # 先頭の列は受信時刻
+                        times = batch[:, 0]
+                        batch = batch[:, 1:]
+                    x = x_selector.make_x(batch, times)
+                    rows = np.column_stack([x, batch])
+                    data_count += len(batch)
+                    if stft != None:
+                        fft_samples.append(batch[:, fft_column])
+                    if trigger != None:
+                        # 切り出したサンプルのみを表示・書き出す（書き出す場合は受信時刻を最後の列として切り出す）
+                        captures = trigger.push(np.column_stack([rows, times]) if export_in_plot else rows)
+                        if len(captures) > 0:
+                            latest_capture = captures[-1]
+                        if export_in_plot:
+                            for capture in captures:
+                                column_writer.write(np.column_stack([capture.rows[:, -1], capture.rows[:, 1:-1]]))
+                        continue
+                    ring_buffers[0].extend(rows)
+                    if export_in_plot:
+                        column_writer.write(np.column_stack([times, batch]))
+                    received = True
 
-        # データを受信
-        if mode == "bin":
-            # バイトデータ送信モードは改行が現れるまで処理する
-            while True:
-                # シリアル通信でデータを読み込み
-                b: bytes = serial_reader.read_byte()
-                # t: str | None = raw2text.read_byte(b)
-                t = raw2text.read_byte(b)
+            # プロット
+            active_buffers = [rb for rb in ring_buffers if len(rb) >= 2]
+            if latest_capture != None:
+                # 最新の切り出しのみを、トリガーした位置を横軸の0として表示する
+                capture_rows = latest_capture.rows
+                capture_x = capture_rows[:, 0] - capture_rows[latest_capture.pre_samples, 0]
+                capture_ys = capture_rows[:, line_columns]
+                renderer.render(capture_x, list(capture_ys.T), (np.nanmin(capture_x), np.nanmax(capture_x)),
+                                (np.nanmin(capture_ys), np.nanmax(capture_ys)))
+                latest_capture = None
+            elif received and len(active_buffers) > 0:
+                line_data: list[tuple] = []
+                x_end = max(rb.latest()[0] for rb in active_buffers)
+                if x_window != None:
+                    x_range = (x_end - x_window, x_end)
+                else:
+                    x_range = (min(rb.view()[0][0] for rb in active_buffers), x_end)
+                y_min: float = float("inf")
+                y_max: float = float("-inf")
+                for rb, x_index, decimator in zip(ring_buffers, x_indexes, decimators):
+                    if x_window != None:
+                        # 表示する範囲のみを二分探索で取り出す
+                        view = x_index.view_latest(x_window)
+                    else:
+                        view = rb.view()
+                    ys = view[line_columns]
+                    if len(rb) < 2 or view.shape[1] == 0:
+                        # まだ受信していないポートの線は空にする
+                        line_data.extend([(view[0], y) for y in ys])
+                        continue
+                    if x_window != None:
+                        y_min = min(y_min, ys.min())
+                        y_max = max(y_max, ys.max())
+                    else:
+                        col_min, col_max = rb.min_max()
+                        y_min = min(y_min, col_min[line_columns].min())
+                        y_max = max(y_max, col_max[line_columns].max())
+                    if decimation == "envelope":
+                        line_data.extend(decimator.decimate(view[0], ys, rb.total_count))
+                    elif decimation == "lttb":
+                        line_data.extend([lttb(view[0], y, pixel_count) for y in ys])
+                    else:
+                        line_data.extend([(view[0], y) for y in ys])
+                renderer.render_lines(line_data, x_range, (y_min, y_max))
 
-                if t == None:
-                    continue
+            # スペクトル
+            if stft != None and len(fft_samples) > 0:
+                spectra = stft.push(np.concatenate(fft_samples))
+                fft_samples.clear()
+                if len(spectra) > 0:
+                    spectrum = spectra[-1]
+                    fft_renderer.render(fft_freqs, [spectrum], (fft_freqs[0], fft_freqs[-1]),
+                                        (spectrum.min(), spectrum.max()))
 
-                if t == "\n":
-                    break
-                data_line += t
+            # 描画の計測値をウィンドウタイトルに表示
+            if time.perf_counter() - stats_time >= 1.0:
+                stats_time = time.perf_counter()
+                snapshot = pipeline_stats.snapshot()
+                if multi_port != None:
+                    dropped = snapshot["acquisition.dropped_rows"]
+                else:
+                    dropped = snapshot["acquisition.dropped_samples"]
+                title = "render {:.1f} ms / frame {:.1f} ms, samples {}, dropped {}, queue {}".format(
+                    snapshot["render.render_time"] * 1000, snapshot["render.frame_time"] * 1000,
+                    data_count, dropped, snapshot["acquisition.queue_depth"])
+                if stft != None:
+                    title += ", fft {:.2f} ms".format(snapshot["fft.fft_time"] * 1000)
+                if trigger != None:
+                    title += ", captures {}".format(snapshot["trigger.captures"])
+                fig.canvas.manager.set_window_title(title)
+                if print_stats:
+                    print(pipeline_stats.format_line(snapshot))
 
+            renderer.wait_next_frame()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if multi_port != None:
+            # ワーカープロセスを停止し、共有メモリを解放する
+            multi_port.stop()
         else:
-            pass
-
-        # 表示
-        # print(data_line, end="")
-        # 区切り文字によるデータをパース
-        data_count += 1
-        for i in range(0, col_count):
-            data_line_list: list[str] = [x.strip() for x in data_line.split(delimiter)]
-            if i < len(data_line_list):
-                try:
-                    d_num = float(data_line_list[i])
-                except ValueError:
-                    print(data_line, "->", data_line_list[i])
-                    d_num = 0
-            else:
-                d_num = 0
-            data_array[i].append(d_num)
-            del data_array[i][0]
-
-        # プロット
-        for i in range(1, col_count):
-            if i < len(line_array):
-                line_array[i].set_data(
-                    data_array[0], data_array[i])
-            else:
-                lines = ax.plot(data_array[0], data_array[i])
-                line_array.append(lines[0])
-        xlim_start = data_array[0][-view_length]
-        xlim_end = data_array[0][-1]
-        ylim_min = min([min(col) for col in data_array[1:]]) * 2
-        ylim_max = max([max(col) for col in data_array[1:]]) * 2
-        ax.set_xlim([xlim_start, xlim_end])
-        ax.set_ylim([ylim_min, ylim_max])
-        plt.pause(0.00001)
+            acquisition.stop()
+        if recorder != None:
+            recorder.close()
+        if column_writer != None:
+            column_writer.close()
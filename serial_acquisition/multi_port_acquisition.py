@@ -0,0 +1,310 @@
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from multiprocessing import shared_memory
+from multiprocessing.synchronize import Event
+import numpy as np
+from numpy.lib import recfunctions
+from serial_acquisition.serial_acquisition import record_columns, spread_receive_times
+from serial_analysis.derived_channels import DerivedChannels
+from serial_processor.serial_byte2data import VariousDataEndian
+from serial_processor.serial_raw2array_pipeline import SerialRaw2ArrayPipeline
+from serial_processor.serial_text2array_pipeline import SerialText2ArrayPipeline
+from serial_reader.serial_reader import SerialReader
+from serial_recorder.column_store import ColumnWriter
+from serial_recorder.raw_recorder import RawRecorder
+
+# 共有メモリの先頭に置くカウンタ（uint64）の数
+# [0] 書き込んだ行の総数（ワーカーが更新） [1] 読み込んだ行の総数（ホストが更新） [2] 破棄した行の総数（ワーカーが更新）
+# [3] ポートを開いた後に1にする（ワーカーが更新）
+SHARED_COUNTER_COUNT: int = 4
+
+
+class SerialPortConfig:
+    '''
+    複数ポートで受信する場合の、ポート毎の設定。
+    '''
+
+    def __init__(self, port: str, baudrate: int, data_format_list: list[str],
+                 endian: VariousDataEndian = VariousDataEndian.BIGENDIAN,
+                 dle: bytes = b"\x10", stx: bytes = b"\x02", etx: bytes = b"\x03",
+                 mode: str = "bin", delimiter: str = ",", checksum: str | None = None) -> None:
+        self.port: str = port
+        self.baudrate: int = baudrate
+        self.data_format_list: list[str] = data_format_list
+        self.endian: VariousDataEndian = endian
+        self.dle: bytes = dle
+        self.stx: bytes = stx
+        self.etx: bytes = etx
+        # 受信モード "bin"（バイナリ）/それ以外（テキスト）
+        self.mode: str = mode
+        self.delimiter: str = delimiter
+        # フレームに付加されたチェックサムの種類（Noneの場合は無し）
+        self.checksum: str | None = checksum
+
+
+class SharedRowRing:
+    '''
+    共有メモリ上の、1つの書き込み側と1つの読み込み側で使うリングバッファ。
+    各行は[受信時刻, データ列...]のfloat64。
+    '''
+
+    def __init__(self, shm: shared_memory.SharedMemory, capacity: int, col_count: int) -> None:
+        self.shm = shm
+        self.capacity: int = capacity
+        self.counters: np.ndarray = np.ndarray((SHARED_COUNTER_COUNT,), dtype=np.uint64, buffer=shm.buf)
+        self.rows: np.ndarray = np.ndarray((capacity, col_count + 1), dtype=np.float64, buffer=shm.buf,
+                                           offset=SHARED_COUNTER_COUNT * 8)
+
+    @staticmethod
+    def size_of(capacity: int, col_count: int) -> int:
+        return SHARED_COUNTER_COUNT * 8 + capacity * (col_count + 1) * 8
+
+    def write(self, rows: np.ndarray) -> None:
+        '''
+        行を書き込む。読み込み待ちの行で一杯の場合、入りきらない行は破棄して数える。
+        '''
+        written = int(self.counters[0])
+        free = self.capacity - (written - int(self.counters[1]))
+        if len(rows) > free:
+            self.counters[2] += len(rows) - free
+            rows = rows[:free]
+        n = len(rows)
+        start = written % self.capacity
+        first = min(n, self.capacity - start)
+        self.rows[start:start + first] = rows[:first]
+        self.rows[:n - first] = rows[first:]
+        # 行を書き込んだ後にカウンタを更新する
+        self.counters[0] = written + n
+
+    def read(self) -> np.ndarray:
+        '''
+        読み込み待ちの行をコピーして返す。
+        '''
+        written = int(self.counters[0])
+        read = int(self.counters[1])
+        n = written - read
+        if n == 0:
+            return self.rows[:0].copy()
+        start = read % self.capacity
+        first = min(n, self.capacity - start)
+        rows = np.concatenate([self.rows[start:start + first], self.rows[:n - first]])
+        self.counters[1] = written
+        return rows
+
+    def release(self) -> None:
+        # 共有メモリを閉じる前に、共有メモリを参照する配列を解放する
+        del self.counters
+        del self.rows
+
+
+def acquisition_worker(config: SerialPortConfig, shm_name: str, capacity: int, stop_event: Event,
+                       derived_channel_list: list[str], export_path: str | None, record_path: str | None) -> None:
+    '''
+    ワーカープロセスの本体。1つのポートから受信してデコードし、派生データ列と受信時刻を付けて共有メモリに書き込む。
+    export_pathを指定した場合は、共有メモリに書き込む前に元の型のまま列毎に書き出す。
+    record_pathを指定した場合は、受信した生データをデコード前に記録する。
+    '''
+    # 受信待ちでブロックしている間にstop()で強制終了された場合も、finallyで書き出し途中のファイルを閉じる
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    column_names: list[str] = ["f{}".format(i) for i in range(0, len(config.data_format_list))]
+    derived: DerivedChannels | None = None
+    if len(derived_channel_list) > 0:
+        derived = DerivedChannels(derived_channel_list, column_names)
+        column_names = column_names + derived.names
+    writer: ColumnWriter | None = None
+    if export_path != None:
+        # テキストモードではdata_format_listの型に関わらず、変換したfloat64のまま書き出す
+        data_format = config.data_format_list if config.mode == "bin" else ["double"] * len(config.data_format_list)
+        export_format = ["double"] + data_format + ["double"] * len(derived_channel_list)
+        writer = ColumnWriter(export_path, export_format, column_names=["time"] + column_names)
+    recorder: RawRecorder | None = None
+    if record_path != None:
+        recorder = RawRecorder(record_path, config.data_format_list, dle=config.dle, stx=config.stx, etx=config.etx,
+                               endian=config.endian, mode=config.mode, delimiter=config.delimiter,
+                               checksum=config.checksum)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    ring = SharedRowRing(shm, capacity, len(config.data_format_list) + len(derived_channel_list))
+    reader = SerialReader(config.port, config.baudrate, None)
+    ring.counters[3] = 1
+    pipeline: SerialRaw2ArrayPipeline | SerialText2ArrayPipeline
+    if config.mode == "bin":
+        pipeline = SerialRaw2ArrayPipeline(config.data_format_list, dle=config.dle, stx=config.stx, etx=config.etx,
+                                           endian=config.endian, checksum=config.checksum)
+    else:
+        pipeline = SerialText2ArrayPipeline(len(config.data_format_list), delimiter=config.delimiter)
+    last_time = time.time()
+    try:
+        while not stop_event.is_set():
+            chunk = reader.read_chunk()
+            now = time.time()
+            if recorder != None:
+                recorder.write(chunk)
+            if writer != None:
+                records = pipeline.read_chunk_records(chunk)
+                values = recfunctions.structured_to_unstructured(records, dtype=np.float64)
+            else:
+                values = pipeline.read_chunk_array(chunk)
+            n = len(values)
+            if n == 0:
+                continue
+            times = spread_receive_times(last_time, now, n, len(chunk), config.baudrate)
+            if derived != None:
+                values = derived.extend(values, times)
+            if writer != None:
+                columns = record_columns(records, values, derived)
+                columns["time"] = times
+                writer.write_columns(columns)
+            rows = np.empty((n, values.shape[1] + 1), dtype=np.float64)
+            rows[:, 0] = times
+            rows[:, 1:] = values
+            last_time = now
+            ring.write(rows)
+    finally:
+        if recorder != None:
+            recorder.close()
+        if writer != None:
+            writer.close()
+        reader.close()
+        ring.release()
+        shm.close()
+
+
+class MultiPortAcquisition:
+    '''
+    複数のシリアルポートから、ポート毎のワーカープロセスで受信とデコードを行う。
+    デコード済みのサンプルは共有メモリで受け取り、受信時刻順に並べた1つの時系列にまとめる。
+
+    まとめた各行は[受信時刻, ポートのインデックス, データ列..., 派生データ列...]であり、
+    データ列が少ないポートはNaNで埋める。
+    '''
+
+    def __init__(self, config_list: list[SerialPortConfig], capacity: int = 1 << 16, max_delay: float = 0.1,
+                 derived_channel_list: list[str] = [], export_path: str | None = None,
+                 record_path: str | None = None) -> None:
+        '''
+        引数:
+
+        * config_list ポート毎の設定。
+        * capacity ポート毎の共有メモリに溜める最大行数。
+        * max_delay 時系列にまとめる為に待つ最大の時間[s]。全てのポートの受信時刻が揃うまで待つが、
+          受信が止まったポートがある場合でも、この時間より古いサンプルはまとめて出力する。
+        * derived_channel_list 派生データ列の定義（DerivedChannelsを参照）。ポート毎にワーカープロセスで計算する。
+        * export_path デコードしたサンプルを書き出すディレクトリ（Noneの場合は書き出さない）。
+          ポート毎のワーカープロセスが、サブディレクトリport0, port1, ...に受信時刻とともに元の型のまま書き出す。
+        * record_path 受信した生データの記録先（Noneの場合は記録しない）。
+          ポート毎のワーカープロセスが、record_pathに".port0", ".port1", ...を付けたファイルに記録する。
+        '''
+        self.config_list: list[SerialPortConfig] = config_list
+        self.capacity: int = capacity
+        self.max_delay: float = max_delay
+        self.derived_channel_list: list[str] = derived_channel_list
+        self.export_path: str | None = export_path
+        self.record_path: str | None = record_path
+        # データ列の最大数と、派生データ列を含めた列数
+        self.data_col_count: int = max(len(c.data_format_list) for c in config_list)
+        self.col_count: int = self.data_col_count + len(derived_channel_list)
+        self.stop_event = multiprocessing.Event()
+        self.shm_list: list[shared_memory.SharedMemory] = []
+        self.ring_list: list[SharedRowRing] = []
+        self.process_list: list[multiprocessing.Process] = []
+        # ポート毎の、時系列にまとめる前の行
+        self.pending: list[np.ndarray] = [np.empty((0, self.col_count + 2)) for c in config_list]
+        # ポート毎の、最後に受け取った行の受信時刻
+        self.last_time: list[float] = [0.0 for c in config_list]
+
+    def start(self) -> None:
+        for i, config in enumerate(self.config_list):
+            col_count = len(config.data_format_list) + len(self.derived_channel_list)
+            shm = shared_memory.SharedMemory(create=True, size=SharedRowRing.size_of(self.capacity, col_count))
+            ring = SharedRowRing(shm, self.capacity, col_count)
+            ring.counters[:] = 0
+            export_path: str | None = None
+            if self.export_path != None:
+                export_path = os.path.join(self.export_path, "port{}".format(i))
+            record_path: str | None = None
+            if self.record_path != None:
+                record_path = "{}.port{}".format(self.record_path, i)
+            process = multiprocessing.Process(
+                target=acquisition_worker,
+                args=(config, shm.name, self.capacity, self.stop_event, self.derived_channel_list, export_path,
+                      record_path),
+                daemon=True)
+            process.start()
+            self.shm_list.append(shm)
+            self.ring_list.append(ring)
+            self.process_list.append(process)
+
+    def stop(self, timeout: float = 1.0) -> None:
+        '''
+        ワーカープロセスを停止し、共有メモリを解放する。
+        '''
+        self.stop_event.set()
+        for process in self.process_list:
+            process.join(timeout)
+            if process.is_alive():
+                # 受信待ちでブロックしている場合は強制終了する
+                process.terminate()
+                process.join()
+        for ring, shm in zip(self.ring_list, self.shm_list):
+            ring.release()
+            shm.close()
+            shm.unlink()
+        self.ring_list.clear()
+        self.shm_list.clear()
+
+    def opened(self) -> bool:
+        '''
+        全てのワーカープロセスがポートを開いたかを返す。開く前に送られたデータは受信できない。
+        '''
+        return all(int(ring.counters[3]) == 1 for ring in self.ring_list)
+
+    def poll(self) -> list[np.ndarray]:
+        '''
+        ポート毎に新たに受け取った行（[受信時刻, データ列...]）を返す。
+        '''
+        return [ring.read() for ring in self.ring_list]
+
+    def merge(self) -> np.ndarray:
+        '''
+        新たに受け取った行を受信時刻順の1つの時系列にまとめ、出力できる行を返す。
+        '''
+        for i, rows in enumerate(self.poll()):
+            if len(rows) == 0:
+                continue
+            merged = np.full((len(rows), self.col_count + 2), np.nan)
+            merged[:, 0] = rows[:, 0]
+            merged[:, 1] = i
+            data_count = len(self.config_list[i].data_format_list)
+            merged[:, 2:data_count + 2] = rows[:, 1:data_count + 1]
+            merged[:, self.data_col_count + 2:] = rows[:, data_count + 1:]
+            self.pending[i] = np.concatenate([self.pending[i], merged])
+            self.last_time[i] = rows[-1, 0]
+
+        # 全てのポートが受信済みの時刻まで出力する（受信が止まったポートはmax_delayまでしか待たない）
+        watermark = max(min(self.last_time), time.time() - self.max_delay)
+        ready: list[np.ndarray] = []
+        for i, rows in enumerate(self.pending):
+            n = int(np.searchsorted(rows[:, 0], watermark, side="right"))
+            ready.append(rows[:n])
+            self.pending[i] = rows[n:]
+        out = np.concatenate(ready)
+        return out[np.argsort(out[:, 0], kind="stable")]
+
+    def stats(self) -> dict[str, float]:
+        '''
+        全てのポートのカウンタの合計を返す。
+        '''
+        return {key: sum(values) for key, values in self.counters().items()}
+
+    def counters(self) -> dict[str, list[int]]:
+        '''
+        ポート毎のカウンタの現在値を返す。
+        '''
+        return {
+            "received_rows": [int(ring.counters[0]) for ring in self.ring_list],
+            "dropped_rows": [int(ring.counters[2]) for ring in self.ring_list],
+            "queue_depth": [int(ring.counters[0] - ring.counters[1]) for ring in self.ring_list],
+        }
@@ -0,0 +1,252 @@
+import queue
+import threading
+import time
+from typing import Protocol
+import numpy as np
+from numpy.lib import recfunctions
+from serial_processor.pipeline_stats import StageTimer
+
+
+class ChunkSource(Protocol):
+    '''
+    read_chunk()で受信済みのバイトをまとめて返す入力元（SerialReader、RawReplaySourceなど）
+    空のチャンクは入力の終端を表す。
+    '''
+
+    def read_chunk(self) -> bytes | bytearray | memoryview:
+        ...
+
+
+class ArrayPipeline(Protocol):
+    '''
+    生データをまとめて入力し、形状(サンプル数, 列数)の配列を返すパイプライン（SerialRaw2ArrayPipelineなど）
+    '''
+
+    def read_chunk_array(self, chunk: bytes | bytearray | memoryview) -> np.ndarray:
+        ...
+
+
+class RecordPipeline(ArrayPipeline, Protocol):
+    '''
+    元の型のままフィールド"f0", "f1", ...を持つ構造化配列も返せるパイプライン
+    '''
+
+    def read_chunk_records(self, chunk: bytes | bytearray | memoryview) -> np.ndarray:
+        ...
+
+
+class DerivedStage(Protocol):
+    '''
+    デコードしたサンプルの後ろに派生データ列を加える処理（DerivedChannelsなど）
+    '''
+
+    names: list[str]
+    uses_time: bool
+
+    def extend(self, values: np.ndarray, times: np.ndarray | None = None) -> np.ndarray:
+        ...
+
+
+class ColumnSink(Protocol):
+    '''
+    列名と列の値の辞書を受け取る出力先（ColumnWriterなど）
+    '''
+
+    def write_columns(self, columns: dict[str, np.ndarray]) -> None:
+        ...
+
+
+class ChunkSink(Protocol):
+    '''
+    受信した生データをそのまま受け取る出力先（RawRecorderなど）
+    '''
+
+    def write(self, chunk: bytes | bytearray | memoryview) -> None:
+        ...
+
+
+def spread_receive_times(last_time: float, now: float, sample_count: int, byte_count: int, baudrate: int) -> np.ndarray:
+    '''
+    1回の受信で得たサンプルに受信時刻を割り当てる。
+    チャンクの送信にかかる時間（1バイト10ビット）の範囲で、今回の受信時刻nowまでを等間隔に割り当てる。
+    '''
+    start = now if baudrate <= 0 else max(last_time, now - byte_count * 10 / baudrate)
+    return np.linspace(start, now, sample_count + 1)[1:]
+
+
+def record_columns(records: np.ndarray, rows: np.ndarray, derived: DerivedStage | None) -> dict[str, np.ndarray]:
+    '''
+    書き出す列の辞書を作成する。データ列は元の型の構造化配列から、派生データ列はrowsの末尾の列から取る。
+    '''
+    columns: dict[str, np.ndarray] = {name: records[name] for name in records.dtype.names}
+    if derived != None:
+        first = rows.shape[1] - len(derived.names)
+        for i, name in enumerate(derived.names):
+            columns[name] = rows[:, first + i]
+    return columns
+
+
+class SerialAcquisition:
+    '''
+    シリアル通信の受信とデコードをバックグラウンドスレッドで行い、デコード済みのサンプルを有限長のキューに溜める。
+    描画側はdrain()で溜まったサンプルを自身のフレームレートで取り出す。
+
+    キューが一杯の場合、新たに受信したサンプルは破棄し、dropped_sample_countに数える。
+    入力元が空のチャンクを返した場合は、入力の終端として受信を終了する。
+    '''
+
+    def __init__(self, source: ChunkSource, pipeline: ArrayPipeline | RecordPipeline, max_queue_batches: int = 1024,
+                 recorder: ChunkSink | None = None, drop_when_full: bool = True,
+                 timestamp: bool = False, baudrate: int = 0, derived: DerivedStage | None = None,
+                 exporter: ColumnSink | None = None) -> None:
+        '''
+        引数:
+
+        * source 受信済みのバイトを返す入力元。
+        * pipeline 生データを数値の配列に変換するパイプライン。
+        * max_queue_batches キューに溜めるバッチ（1回の受信で得たサンプル群）の最大数。
+        * recorder 受信した生データをデコード前に記録する出力先。
+        * drop_when_full キューが一杯の場合にサンプルを破棄するか。Falseの場合は空くまで待つ（記録ファイルの再生など）。
+        * timestamp Trueの場合、各サンプルの先頭の列に受信時刻（time.time()）を加える。
+        * baudrate 受信時刻を割り当てる為のボーレート。0の場合は1回の受信で得たサンプルに同じ時刻を割り当てる。
+        * derived デコードしたサンプルの後ろに派生データ列を加える処理（DerivedChannelsなど）。
+        * exporter デコードしたサンプルを、元の型のまま派生データ列、受信時刻"time"とともに書き出す出力先（ColumnWriterなど）。
+          キューに入れる前に書き出すため、キューが一杯で破棄したサンプルも書き出す。
+          指定する場合、pipelineはread_chunk_records()を持つ必要がある。
+        '''
+        self.source = source
+        self.pipeline = pipeline
+        self.recorder = recorder
+        self.drop_when_full: bool = drop_when_full
+        self.timestamp: bool = timestamp
+        self.baudrate: int = baudrate
+        self.derived = derived
+        self.exporter = exporter
+        self.sample_queue: queue.Queue[np.ndarray] = queue.Queue(maxsize=max_queue_batches)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.stop_event = threading.Event()
+        # 受信スレッドで発生した例外（drain()で呼び出し側に送出する）
+        self.error: BaseException | None = None
+        # 入力の終端に達したか
+        self.finished: bool = False
+
+        # カウンタ
+        self.received_byte_count: int = 0
+        self.received_sample_count: int = 0
+        self.dropped_sample_count: int = 0
+        self.queue_high_water: int = 0
+        # 受信待ちを含む読み込み時間と、デコード時間
+        self.read_timer = StageTimer()
+        self.pipeline_timer = StageTimer()
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self, timeout: float | None = 1.0) -> None:
+        '''
+        受信スレッドに停止を要求する。入力元の読み込みがブロックしている場合は、timeout秒待って戻る。
+        '''
+        self.stop_event.set()
+        self.thread.join(timeout)
+
+    def run(self) -> None:
+        '''
+        受信スレッドの本体。受信、デコードしてキューに溜める。
+        '''
+        last_time = time.time()
+        try:
+            while not self.stop_event.is_set():
+                t = self.read_timer.start()
+                chunk = self.source.read_chunk()
+                self.read_timer.stop(t)
+                now = time.time()
+                if len(chunk) == 0:
+                    self.finished = True
+                    break
+                self.received_byte_count += len(chunk)
+                if self.recorder != None:
+                    self.recorder.write(chunk)
+                t = self.pipeline_timer.start()
+                if self.exporter != None:
+                    # 書き出す値は、float64に変換する前の元の型から取る
+                    records = self.pipeline.read_chunk_records(chunk)
+                    rows = recfunctions.structured_to_unstructured(records, dtype=np.float64)
+                else:
+                    rows = self.pipeline.read_chunk_array(chunk)
+                self.pipeline_timer.stop(t)
+                if len(rows) == 0:
+                    continue
+                self.received_sample_count += len(rows)
+                times: np.ndarray | None = None
+                if self.timestamp or self.exporter != None or (self.derived != None and self.derived.uses_time):
+                    times = spread_receive_times(last_time, now, len(rows), len(chunk), self.baudrate)
+                    last_time = now
+                if self.derived != None:
+                    rows = self.derived.extend(rows, times)
+                if self.exporter != None:
+                    columns = record_columns(records, rows, self.derived)
+                    columns["time"] = times
+                    self.exporter.write_columns(columns)
+                if self.timestamp:
+                    rows = np.column_stack([times, rows])
+                if self.drop_when_full:
+                    try:
+                        self.sample_queue.put_nowait(rows)
+                    except queue.Full:
+                        self.dropped_sample_count += len(rows)
+                        continue
+                else:
+                    if not self.put_blocking(rows):
+                        break
+                depth = self.sample_queue.qsize()
+                if depth > self.queue_high_water:
+                    self.queue_high_water = depth
+        except BaseException as e:
+            self.error = e
+
+    def put_blocking(self, rows: np.ndarray) -> bool:
+        '''
+        キューが空くまで待ってサンプルを溜める。停止を要求された場合はFalseを返す。
+        '''
+        while not self.stop_event.is_set():
+            try:
+                self.sample_queue.put(rows, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def drain(self, max_batches: int | None = None) -> list[np.ndarray]:
+        '''
+        キューに溜まったバッチを取り出す。溜まっていない場合は空の配列を返す。
+        '''
+        if self.error != None:
+            raise RuntimeError("Acquisition thread stopped.") from self.error
+        batches: list[np.ndarray] = []
+        while max_batches == None or len(batches) < max_batches:
+            try:
+                batches.append(self.sample_queue.get_nowait())
+            except queue.Empty:
+                break
+        return batches
+
+    def stats(self) -> dict[str, float]:
+        '''
+        カウンタと処理時間をまとめて返す。時間の単位は秒。
+        '''
+        result: dict[str, float] = dict(self.counters())
+        result.update(self.read_timer.stats("read_"))
+        result.update(self.pipeline_timer.stats("pipeline_"))
+        return result
+
+    def counters(self) -> dict[str, int]:
+        '''
+        カウンタの現在値を返す。
+        '''
+        return {
+            "received_bytes": self.received_byte_count,
+            "received_samples": self.received_sample_count,
+            "dropped_samples": self.dropped_sample_count,
+            "queue_depth": self.sample_queue.qsize(),
+            "queue_high_water": self.queue_high_water,
+        }
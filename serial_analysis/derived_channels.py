@@ -0,0 +1,376 @@
+import ast
+import time
+import numpy as np
+
+# 式の中で使える関数（引数・戻り値は配列）
+EXPRESSION_FUNCTIONS: dict[str, object] = {
+    "sqrt": np.sqrt,
+    "abs": np.abs,
+    "exp": np.exp,
+    "log": np.log,
+    "log10": np.log10,
+    "sin": np.sin,
+    "cos": np.cos,
+    "tan": np.tan,
+    "atan2": np.arctan2,
+    "hypot": np.hypot,
+    "min": np.minimum,
+    "max": np.maximum,
+}
+
+# 式の中で受信時刻を表す名前
+TIME_NAME: str = "time"
+
+# 式の中で使える演算子
+EXPRESSION_OPERATORS: tuple[type, ...] = (
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod, ast.USub, ast.UAdd)
+
+
+class RollingStatistic:
+    '''
+    直近windowサンプルの統計量を、入力されたバッチ毎にまとめて更新する。
+    状態は窓の大きさの配列に保持し、1回の呼び出しの計算量はバッチのサンプル数に比例する（窓の大きさによらない）。
+    '''
+
+    def __init__(self, window: int) -> None:
+        if window < 1:
+            raise ValueError("window must be 1 or more.")
+        self.window: int = window
+        # 入力されたサンプル数
+        self.count: int = 0
+
+    def __call__(self, values: np.ndarray) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        result = self.compute(values)
+        self.count += len(values)
+        return result
+
+    def window_counts(self, length: int) -> np.ndarray:
+        '''
+        今回のバッチの各サンプルの窓に含まれる実際のサンプル数（入力開始直後はwindowより少ない）
+        '''
+        return np.minimum(np.arange(self.count + 1, self.count + length + 1), self.window)
+
+    def compute(self, values: np.ndarray) -> np.ndarray:
+        ...
+
+
+class RollingSum(RollingStatistic):
+    '''
+    移動和。窓の中のサンプルをリングバッファに保持し、窓に入るサンプルと出るサンプルの差で累計を更新する。
+    丸め誤差が溜まらないよう、windowサンプル毎に累計をリングバッファの和で計算し直す。
+    '''
+
+    def __init__(self, window: int) -> None:
+        super().__init__(window)
+        # 窓の中のサンプル（ring[ring_pos]が最も古い）
+        self.ring: np.ndarray = np.zeros(window)
+        self.ring_pos: int = 0
+        self.total: float = 0.0
+        # 前回累計を計算し直してから入力されたサンプル数
+        self.resum_count: int = 0
+
+    def running_sum(self, values: np.ndarray) -> np.ndarray:
+        n = len(values)
+        if n == 0:
+            return np.empty(0)
+        w = self.window
+        # 各サンプルの入力で窓から出るサンプル（先頭のwindowサンプル分はリングバッファから）
+        k = min(n, w)
+        leaving = np.empty(n)
+        leaving[:k] = self.ring[(self.ring_pos + np.arange(k)) % w]
+        leaving[k:] = values[:n - k]
+        sums = self.total + np.cumsum(values - leaving)
+        self.ring[(self.ring_pos + np.arange(n - k, n)) % w] = values[n - k:]
+        self.ring_pos = (self.ring_pos + n) % w
+        self.total = float(sums[-1])
+        self.resum_count += n
+        if self.resum_count >= w:
+            self.total = float(self.ring.sum())
+            self.resum_count = 0
+        return sums
+
+
+class RollingMean(RollingSum):
+    '''
+    移動平均
+    '''
+
+    def compute(self, values: np.ndarray) -> np.ndarray:
+        return self.running_sum(values) / self.window_counts(len(values))
+
+
+class RollingRms(RollingSum):
+    '''
+    移動二乗平均平方根
+    '''
+
+    def compute(self, values: np.ndarray) -> np.ndarray:
+        mean_square = self.running_sum(values * values) / self.window_counts(len(values))
+        return np.sqrt(np.maximum(mean_square, 0.0))
+
+
+class RollingMax(RollingStatistic):
+    '''
+    移動最大値（包絡線の上側）
+
+    van Herk/Gil-Werman法で求める。入力の通し番号をwindow毎のブロックに分けると、
+    窓の最大値は「窓の先頭を含むブロックの、先頭以降の最大値」と「窓の末尾を含むブロックの、末尾までの最大値」の大きい方になる。
+    前者は完成した直前のブロックの後ろからの累積最大値として保持し、後者は入力中のブロックの累積最大値として更新する。
+    '''
+
+    # 最小値は符号を反転して最大値として求める
+    sign: float = 1.0
+
+    def __init__(self, window: int) -> None:
+        super().__init__(window)
+        # 入力中のブロックのサンプルと、ブロックの先頭からの最大値
+        self.block: np.ndarray = np.empty(window)
+        self.block_fill: int = 0
+        self.block_max: float = -np.inf
+        # 直前のブロックの後ろからの累積最大値（末尾は窓が直前のブロックを含まない場合の-inf）
+        self.suffix: np.ndarray = np.full(window + 1, -np.inf)
+
+    def compute(self, values: np.ndarray) -> np.ndarray:
+        v = values * self.sign
+        n = len(v)
+        w = self.window
+        result = np.empty(n)
+        # 入力中のブロックの残り
+        i = self.fill_block(v, 0, result)
+        # 全体がバッチに含まれるブロックはまとめて計算する
+        block_count = (n - i) // w
+        if block_count > 0:
+            blocks = v[i:i + block_count * w].reshape(block_count, w)
+            suffix = np.full((block_count + 1, w + 1), -np.inf)
+            suffix[0] = self.suffix
+            suffix[1:, :w] = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1]
+            result[i:i + block_count * w] = np.maximum(
+                np.maximum.accumulate(blocks, axis=1), suffix[:block_count, 1:]).ravel()
+            self.suffix = suffix[block_count]
+            i += block_count * w
+        # 次のブロックの先頭
+        self.fill_block(v, i, result)
+        return result * self.sign
+
+    def fill_block(self, v: np.ndarray, i: int, result: np.ndarray) -> int:
+        '''
+        v[i:]を入力中のブロックが埋まるまで書き込み、書き込んだ次のインデックスを返す。
+        '''
+        w = self.window
+        take = min(len(v) - i, w - self.block_fill)
+        if take <= 0:
+            return i
+        segment = v[i:i + take]
+        prefix = np.maximum(np.maximum.accumulate(segment), self.block_max)
+        result[i:i + take] = np.maximum(prefix, self.suffix[self.block_fill + 1:self.block_fill + take + 1])
+        self.block[self.block_fill:self.block_fill + take] = segment
+        self.block_fill += take
+        self.block_max = float(prefix[-1])
+        if self.block_fill == w:
+            self.suffix[:w] = np.maximum.accumulate(self.block[::-1])[::-1]
+            self.block_fill = 0
+            self.block_max = -np.inf
+        return i + take
+
+
+class RollingMin(RollingMax):
+    '''
+    移動最小値（包絡線の下側）
+    '''
+
+    sign = -1.0
+
+
+class Difference(RollingStatistic):
+    '''
+    1つ前のサンプルとの差分。最初のサンプルは0とする。
+    diff(f0) / diff(time)（受信時刻による微分）、diff(f0) / diff(f1)（f1がティックの場合）のように割ると微分になる。
+    '''
+
+    def __init__(self) -> None:
+        super().__init__(2)
+        self.last: float = np.nan
+
+    def compute(self, values: np.ndarray) -> np.ndarray:
+        if len(values) == 0:
+            return np.empty(0)
+        result = np.diff(values, prepend=self.last)
+        if self.count == 0:
+            result[0] = 0.0
+        self.last = float(values[-1])
+        return result
+
+
+# 式の中で使える移動統計量（関数名: (クラス, 窓のサンプル数を引数に取るか)）
+ROLLING_FUNCTIONS: dict[str, tuple[type, bool]] = {
+    "mavg": (RollingMean, True),
+    "rms": (RollingRms, True),
+    "rmax": (RollingMax, True),
+    "rmin": (RollingMin, True),
+    "diff": (Difference, False),
+}
+
+
+class DerivedChannel:
+    '''
+    1つの派生データ列。式は生成時に1度だけ検証・コンパイルし、バッチ毎に配列全体に対して評価する。
+    '''
+
+    def __init__(self, definition: str) -> None:
+        '''
+        definitionは"名前 = 式"の形式で指定する。例:
+
+        * "norm = sqrt(f0^2 + f1^2)"
+        * "f0_avg = mavg(f0, 32)"（直近32サンプルの移動平均）
+        * "f0_ac = rms(f0 - mavg(f0, 256), 256)"
+
+        式には列名、受信時刻time[s]、数値、+ - * / ^(**) %、EXPRESSION_FUNCTIONSの関数、
+        ROLLING_FUNCTIONSの移動統計量を使える。
+        名前にはtime、関数名、"_rolling"で始まる名前は使えない。
+        '''
+        name, separator, expression = definition.partition("=")
+        if separator == "" or not name.strip().isidentifier():
+            raise ValueError("Derived channel must be 'name = expression'. definition:{}".format(definition))
+        self.name: str = name.strip()
+        if self.name == TIME_NAME or self.name in EXPRESSION_FUNCTIONS or self.name in ROLLING_FUNCTIONS or \
+                self.name.startswith("_rolling"):
+            raise ValueError("Derived channel name is reserved. name:{}".format(self.name))
+        self.expression: str = expression.strip()
+        # 式の中の移動統計量（呼び出し箇所毎に状態を持つ）
+        self.rolling_list: list[RollingStatistic] = []
+        # 累乗は数式と同じく^でも書けるようにする（Pythonの^は優先順位が低いため、構文解析の前に置き換える）
+        tree = ast.parse(self.expression.replace("^", "**"), mode="eval")
+        self.variable_names: set[str] = set()
+        tree = self.check(tree)
+        self.code = compile(ast.fix_missing_locations(tree), "<{}>".format(self.name), "eval")
+
+    def check(self, node: ast.AST) -> ast.AST:
+        '''
+        使える構文のみで書かれているかを検証し、移動統計量の呼び出しを状態を持つ関数の呼び出しに置き換える。
+        '''
+        if isinstance(node, ast.Expression):
+            node.body = self.check(node.body)
+            return node
+        if isinstance(node, ast.BinOp) and isinstance(node.op, EXPRESSION_OPERATORS):
+            node.left = self.check(node.left)
+            node.right = self.check(node.right)
+            return node
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, EXPRESSION_OPERATORS):
+            node.operand = self.check(node.operand)
+            return node
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return node
+        if isinstance(node, ast.Name):
+            if node.id not in EXPRESSION_FUNCTIONS:
+                self.variable_names.add(node.id)
+            return node
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and len(node.keywords) == 0:
+            function = node.func.id
+            if function in ROLLING_FUNCTIONS:
+                return self.check_rolling(node)
+            if function in EXPRESSION_FUNCTIONS:
+                node.args = [self.check(arg) for arg in node.args]
+                return node
+            raise ValueError("Unknown function in derived channel. function:{}".format(function))
+        raise ValueError("Unsupported syntax in derived channel. expression:{}".format(self.expression))
+
+    def check_rolling(self, node: ast.Call) -> ast.AST:
+        rolling_class, has_window = ROLLING_FUNCTIONS[node.func.id]
+        if has_window:
+            if len(node.args) != 2 or not isinstance(node.args[1], ast.Constant) or \
+                    not isinstance(node.args[1].value, int):
+                raise ValueError("{}() takes a value and a constant window. expression:{}".format(
+                    node.func.id, self.expression))
+            rolling = rolling_class(node.args[1].value)
+        else:
+            if len(node.args) != 1:
+                raise ValueError("{}() takes a value. expression:{}".format(node.func.id, self.expression))
+            rolling = rolling_class()
+        self.rolling_list.append(rolling)
+        # 呼び出し箇所毎の状態を持つ関数"_rolling{i}"の呼び出しに置き換える
+        name = "_rolling{}".format(len(self.rolling_list) - 1)
+        return ast.Call(func=ast.Name(id=name, ctx=ast.Load()), args=[self.check(node.args[0])], keywords=[])
+
+    def evaluate(self, namespace: dict[str, object], length: int) -> np.ndarray:
+        '''
+        列名を配列に対応させたnamespaceで式を評価し、長さlengthのfloat64配列を返す。
+        0での除算などはinf、NaNとしてそのまま表示する。
+        '''
+        scope = dict(namespace)
+        for i, rolling in enumerate(self.rolling_list):
+            scope["_rolling{}".format(i)] = rolling
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            result = eval(self.code, {"__builtins__": {}}, scope)
+        return np.broadcast_to(np.asarray(result, dtype=np.float64), (length,))
+
+
+class DerivedChannels:
+    '''
+    デコード後のサンプルに、式で定義した派生データ列を加える。
+    派生データ列は定義した順に評価し、後の式では前の派生データ列の名前も使える。
+    式の中のtimeは、apply()に渡した各サンプルの受信時刻を表す。
+    '''
+
+    def __init__(self, definitions: list[str], column_names: list[str]) -> None:
+        '''
+        引数:
+
+        * definitions 派生データ列の定義（"名前 = 式"）の配列。
+        * column_names 入力するサンプルの列名（data_formatの順に"f0", "f1", ...など）。
+        '''
+        self.column_names: list[str] = column_names
+        self.channels: list[DerivedChannel] = [DerivedChannel(d) for d in definitions]
+        self.names: list[str] = [c.name for c in self.channels]
+        known = set(column_names) | {TIME_NAME}
+        for channel in self.channels:
+            # 入力した列や前の派生データ列と同じ名前は、後の式から参照できなくなり、書き出す列名も重複するため拒否する
+            if channel.name in known:
+                raise ValueError("Derived channel name is already used. name:{}".format(channel.name))
+            unknown = channel.variable_names - known
+            if len(unknown) > 0:
+                raise ValueError("Unknown column in derived channel. name:{} columns:{}".format(
+                    channel.name, sorted(unknown)))
+            known.add(channel.name)
+        # 受信時刻を使う式があるか
+        self.uses_time: bool = any(TIME_NAME in c.variable_names for c in self.channels)
+        # 計測値
+        self.sample_count: int = 0
+        self.evaluate_time: float = 0.0
+
+    def apply(self, values: np.ndarray, times: np.ndarray | None = None) -> np.ndarray:
+        '''
+        形状(サンプル数, 列数)の配列から、形状(サンプル数, 派生データ列の数)の配列を計算する。
+        timesは各サンプルの受信時刻[s]で、式がtimeを使う場合は必須。
+        '''
+        if self.uses_time and times is None:
+            raise ValueError("Derived channels using time require receive times.")
+        start = time.perf_counter()
+        length = len(values)
+        derived = np.empty((length, len(self.channels)), dtype=np.float64)
+        namespace: dict[str, object] = dict(EXPRESSION_FUNCTIONS)
+        if times is not None:
+            namespace[TIME_NAME] = times
+        for i, name in enumerate(self.column_names):
+            namespace[name] = values[:, i]
+        for i, channel in enumerate(self.channels):
+            derived[:, i] = channel.evaluate(namespace, length)
+            namespace[channel.name] = derived[:, i]
+        self.sample_count += length
+        self.evaluate_time = time.perf_counter() - start
+        return derived
+
+    def extend(self, values: np.ndarray, times: np.ndarray | None = None) -> np.ndarray:
+        '''
+        入力した列の後ろに派生データ列を加えた配列を返す。
+        '''
+        return np.hstack([values, self.apply(values, times)])
+
+    def stats(self) -> dict[str, float]:
+        '''
+        計測値を返す。時間の単位は秒。
+        '''
+        return {
+            "samples": self.sample_count,
+            "evaluate_time": self.evaluate_time,
+        }
@@ -0,0 +1,123 @@
+import time
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def make_window(name: str, size: int) -> np.ndarray:
+    '''
+    窓関数を作成する。"hann"/"hamming"/"blackman"/"rect"に対応する。
+    '''
+    if name == "hann":
+        return np.hanning(size)
+    elif name == "hamming":
+        return np.hamming(size)
+    elif name == "blackman":
+        return np.blackman(size)
+    elif name == "rect":
+        return np.ones(size)
+    raise ValueError("Unknown window function. window:{}".format(name))
+
+
+class StftEngine:
+    '''
+    逐次入力されるサンプル列に対して、窓をhopサンプルずつずらしながら短時間フーリエ変換(STFT)を行う。
+
+    * 入力を溜めるバッファと窓を掛けたフレームのバッファは、最初に確保したものを使い回す。
+    * 溜まったフレームは最大max_batch_framesフレームずつまとめてrfftする。
+    '''
+
+    def __init__(self, window_size: int = 1024, hop: int = 256, window: str = "hann",
+                 sample_rate: float = 1.0, max_batch_frames: int = 16, db: bool = True) -> None:
+        '''
+        引数:
+
+        * window_size 1フレームのサンプル数。
+        * hop フレームをずらすサンプル数。
+        * window 窓関数の名前。
+        * sample_rate サンプリング周波数[Hz]。周波数軸の計算に用いる。
+        * max_batch_frames まとめて変換する最大フレーム数。
+        * db Trueの場合は振幅をdBで、Falseの場合は振幅をそのまま返す。
+        '''
+        if hop <= 0 or hop > window_size:
+            raise ValueError("hop must be 1 to window_size.")
+        self.window_size: int = window_size
+        self.hop: int = hop
+        self.sample_rate: float = sample_rate
+        self.max_batch_frames: int = max_batch_frames
+        self.db: bool = db
+        self.window: np.ndarray = make_window(window, window_size)
+        # 窓関数による振幅の減少を補正する係数
+        self.amplitude_scale: float = 2.0 / self.window.sum()
+
+        # 未処理のサンプルを溜めるバッファ（先頭が次のフレームの開始位置）
+        self.buffer: np.ndarray = np.zeros(window_size + hop * max_batch_frames)
+        self.fill: int = 0
+        # 窓を掛けたフレームのバッファ
+        self.frames: np.ndarray = np.empty((max_batch_frames, window_size))
+
+        # 計測値
+        self.frame_count: int = 0
+        self.fft_time: float = 0.0
+        self.total_fft_time: float = 0.0
+
+    def freqs(self) -> np.ndarray:
+        '''
+        スペクトルの各ビンの周波数を返す。
+        '''
+        return np.fft.rfftfreq(self.window_size, 1.0 / self.sample_rate)
+
+    def reset(self) -> None:
+        self.fill = 0
+
+    def push(self, samples: np.ndarray) -> np.ndarray:
+        '''
+        サンプルを入力し、新たに完成したフレームのスペクトルを形状(フレーム数, ビン数)の配列で返す。
+        '''
+        start = time.perf_counter()
+        samples = np.asarray(samples, dtype=np.float64)
+        spectra: list[np.ndarray] = []
+        pos = 0
+        while pos < len(samples):
+            n = min(len(samples) - pos, len(self.buffer) - self.fill)
+            self.buffer[self.fill:self.fill + n] = samples[pos:pos + n]
+            self.fill += n
+            pos += n
+            spectra.extend(self.transform_ready())
+
+        self.fft_time = time.perf_counter() - start
+        self.total_fft_time += self.fft_time
+        if len(spectra) == 0:
+            return np.empty((0, self.window_size // 2 + 1))
+        return np.concatenate(spectra)
+
+    def transform_ready(self) -> list[np.ndarray]:
+        '''
+        バッファに溜まった完成済みのフレームをまとめて変換し、使ったサンプルをバッファから取り除く。
+        '''
+        spectra: list[np.ndarray] = []
+        while self.fill >= self.window_size:
+            count = min(1 + (self.fill - self.window_size) // self.hop, self.max_batch_frames)
+            view = sliding_window_view(self.buffer[:self.fill], self.window_size)[::self.hop][:count]
+            frames = self.frames[:count]
+            np.multiply(view, self.window, out=frames)
+            magnitude = np.abs(np.fft.rfft(frames, axis=1)) * self.amplitude_scale
+            if self.db:
+                magnitude = 20 * np.log10(magnitude + 1e-12)
+            spectra.append(magnitude)
+            self.frame_count += count
+
+            consumed = count * self.hop
+            remain = self.fill - consumed
+            self.buffer[:remain] = self.buffer[consumed:self.fill]
+            self.fill = remain
+        return spectra
+
+    def stats(self) -> dict[str, float]:
+        '''
+        変換の計測値を返す。時間の単位は秒。
+        '''
+        return {
+            "frames": self.frame_count,
+            "fft_time": self.fft_time,
+            "total_fft_time": self.total_fft_time,
+        }
@@ -0,0 +1,204 @@
+from enum import Enum
+import time
+import numpy as np
+
+
+class TriggerEdge(Enum):
+    '''
+    トリガーを掛けるエッジ
+    '''
+    RISING = 1
+    FALLING = 2
+
+
+class Capture:
+    '''
+    トリガー位置の前後を切り出したサンプル。
+    rowsは形状(pre_samples + post_samples, 列数)で、rows[pre_samples]がトリガーを検出したサンプル。
+    '''
+
+    def __init__(self, rows: np.ndarray, trigger_index: int, pre_samples: int) -> None:
+        self.rows: np.ndarray = rows
+        # トリガーを検出したサンプルの通し番号
+        self.trigger_index: int = trigger_index
+        self.pre_samples: int = pre_samples
+
+
+class TriggerEngine:
+    '''
+    逐次入力されるサンプルのfield_index番目の列がlevelを横切った瞬間を検出し、前後のサンプルを切り出す。
+
+    * ヒステリシス: 立ち上がりの場合、一度level - hysteresisを下回ってから（アーム）levelに達した時にトリガーする。
+      立ち下がりの場合は、level + hysteresisを上回ってからlevelを下回った時にトリガーする。
+      雑音でlevel付近を往復しても、1回しかトリガーしない。
+    * ホールドオフ: トリガーしてからholdoffサンプルの間と、切り出し中は次のトリガーを無視する。
+    * トリガー前のサンプルは、最初に確保したpre_samples行のリングバッファに保持する。
+      入力開始からpre_samplesサンプルが溜まるまではトリガーしない。
+
+    トリガーの検出はバッチ毎に配列全体に対してまとめて行い、ホールドオフの判定のみトリガーの候補毎に行う。
+    '''
+
+    def __init__(self, col_count: int, field_index: int, level: float,
+                 edge: TriggerEdge = TriggerEdge.RISING, hysteresis: float = 0.0, holdoff: int = 0,
+                 pre_samples: int = 100, post_samples: int = 400, single: bool = False) -> None:
+        '''
+        引数:
+
+        * col_count 入力するサンプルの列数。
+        * field_index トリガーを掛ける列のインデックス。
+        * level トリガーレベル。
+        * edge 立ち上がり/立ち下がり。
+        * hysteresis ヒステリシスの幅（0以上）。
+        * holdoff トリガーしてから次のトリガーを受け付けるまでのサンプル数。
+        * pre_samples/post_samples トリガー前/後（トリガーしたサンプルを含む）に切り出すサンプル数。
+        * single Trueの場合、1回切り出した後はrearm()を呼ぶまでトリガーしない。
+        '''
+        if hysteresis < 0:
+            raise ValueError("hysteresis must be 0 or more.")
+        if pre_samples < 0 or post_samples < 1:
+            raise ValueError("pre_samples must be 0 or more and post_samples must be 1 or more.")
+        self.col_count: int = col_count
+        self.field_index: int = field_index
+        self.edge: TriggerEdge = edge
+        # 立ち下がりは符号を反転して立ち上がりとして検出する
+        self.sign: float = 1.0 if edge == TriggerEdge.RISING else -1.0
+        self.level: float = level * self.sign
+        self.arm_level: float = self.level - hysteresis
+        self.holdoff: int = holdoff
+        self.pre_samples: int = pre_samples
+        self.post_samples: int = post_samples
+        self.single: bool = single
+
+        # トリガー前のサンプルを保持するリングバッファ
+        self.pre_ring: np.ndarray = np.zeros((pre_samples, col_count))
+        self.ring_pos: int = 0
+        # ヒステリシスの状態 -1: アーム済み（levelを超えるとトリガー） 1: level以上 0: 入力開始直後
+        self.state: int = 0
+        # 次にトリガーを受け付けるサンプルの通し番号
+        self.next_allowed: int = pre_samples
+        self.stopped: bool = False
+        # 切り出し中のサンプルと、書き込んだ行数
+        self.capture: Capture | None = None
+        self.capture_fill: int = 0
+
+        # 計測値
+        self.sample_count: int = 0
+        self.trigger_count: int = 0
+        self.ignored_trigger_count: int = 0
+        self.capture_count: int = 0
+        self.detect_time: float = 0.0
+
+    def rearm(self) -> None:
+        '''
+        single=Trueで停止したトリガーを再び受け付ける。
+        '''
+        self.stopped = False
+
+    def detect(self, values: np.ndarray) -> np.ndarray:
+        '''
+        トリガーの候補となるサンプルのインデックスを返す。ヒステリシスの状態は次のバッチに引き継ぐ。
+        '''
+        n = len(values)
+        if n == 0:
+            return np.empty(0, dtype=np.intp)
+        v = values * self.sign
+        # level以上を1、アームするレベル未満を-1とし、それ以外（NaNを含む）は直前の状態を保つ
+        code = np.zeros(n, dtype=np.int8)
+        code[v >= self.level] = 1
+        code[v < self.arm_level] = -1
+        last_event = np.maximum.accumulate(np.where(code != 0, np.arange(n), -1))
+        state = np.where(last_event >= 0, code[np.maximum(last_event, 0)], self.state)
+        previous = np.empty(n, dtype=state.dtype)
+        previous[0] = self.state
+        previous[1:] = state[:-1]
+        self.state = int(state[-1])
+        return np.flatnonzero((state == 1) & (previous == -1))
+
+    def push(self, rows: np.ndarray) -> list[Capture]:
+        '''
+        形状(サンプル数, 列数)のサンプルを入力し、切り出しが完了したCaptureの配列を返す。
+        '''
+        start = time.perf_counter()
+        n = len(rows)
+        base = self.sample_count
+        captures: list[Capture] = []
+        candidates = self.detect(rows[:, self.field_index])
+        self.trigger_count += len(candidates)
+
+        # 前のバッチから続く切り出し
+        pos = 0
+        if self.capture != None:
+            pos = self.fill_post(rows, 0, captures)
+        for c in candidates:
+            index = base + int(c)
+            if self.stopped or c < pos or index < self.next_allowed:
+                self.ignored_trigger_count += 1
+                continue
+            self.start_capture(rows, int(c), index)
+            pos = self.fill_post(rows, int(c), captures)
+
+        self.write_pre_ring(rows)
+        self.sample_count += n
+        self.detect_time = time.perf_counter() - start
+        return captures
+
+    def start_capture(self, rows: np.ndarray, c: int, index: int) -> None:
+        '''
+        バッチのc番目のサンプルでトリガーし、トリガー前のサンプルをリングバッファと今回のバッチから切り出す。
+        '''
+        pre = self.pre_samples
+        capture_rows = np.empty((pre + self.post_samples, self.col_count))
+        from_batch = min(c, pre)
+        from_ring = pre - from_batch
+        if from_ring > 0:
+            ring_index = (self.ring_pos - from_ring + np.arange(from_ring)) % pre
+            capture_rows[:from_ring] = self.pre_ring[ring_index]
+        capture_rows[from_ring:pre] = rows[c - from_batch:c]
+        self.capture = Capture(capture_rows, index, pre)
+        self.capture_fill = pre
+        self.next_allowed = index + max(self.holdoff, self.post_samples)
+        if self.single:
+            self.stopped = True
+
+    def fill_post(self, rows: np.ndarray, pos: int, captures: list[Capture]) -> int:
+        '''
+        切り出し中のCaptureにバッチのpos番目以降のサンプルを書き込み、書き込んだ次のインデックスを返す。
+        '''
+        capture = self.capture
+        end = min(len(rows), pos + len(capture.rows) - self.capture_fill)
+        capture.rows[self.capture_fill:self.capture_fill + end - pos] = rows[pos:end]
+        self.capture_fill += end - pos
+        if self.capture_fill == len(capture.rows):
+            captures.append(capture)
+            self.capture = None
+            self.capture_count += 1
+        return end
+
+    def write_pre_ring(self, rows: np.ndarray) -> None:
+        '''
+        バッチの末尾pre_samples行をリングバッファに書き込む。
+        '''
+        pre = self.pre_samples
+        if pre == 0 or len(rows) == 0:
+            return
+        if len(rows) >= pre:
+            self.pre_ring[:] = rows[len(rows) - pre:]
+            self.ring_pos = 0
+            return
+        n = len(rows)
+        first = min(n, pre - self.ring_pos)
+        self.pre_ring[self.ring_pos:self.ring_pos + first] = rows[:first]
+        self.pre_ring[:n - first] = rows[first:]
+        self.ring_pos = (self.ring_pos + n) % pre
+
+    def stats(self) -> dict[str, float]:
+        '''
+        計測値を返す。時間の単位は秒。
+        '''
+        return {
+            "samples": self.sample_count,
+            "triggers": self.trigger_count,
+            "ignored_triggers": self.ignored_trigger_count,
+            "captures": self.capture_count,
+            "detect_time": self.detect_time,
+        }
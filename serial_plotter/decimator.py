@@ -0,0 +1,135 @@
+import numpy as np
+
+
+def minmax_envelope(x: np.ndarray, y: np.ndarray, bucket_count: int) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    サンプルをbucket_count個の区間に分け、区間毎に最小値と最大値の2点を時系列順に残して間引く。
+    サンプル数が2*bucket_count以下の場合は間引かずに返す。
+    '''
+    n = len(x)
+    if bucket_count <= 0 or n <= 2 * bucket_count:
+        return x, y
+    bucket_size = n // bucket_count
+    # 区間の大きさで割り切れない先頭のサンプルはそのまま残す
+    head = n - bucket_size * bucket_count
+    first, second = envelope_indices(y[head:].reshape(bucket_count, bucket_size))
+    offsets = head + np.arange(bucket_count) * bucket_size
+    indices = np.concatenate(
+        [np.arange(head), np.stack([first + offsets, second + offsets], axis=1).ravel()])
+    return x[indices], y[indices]
+
+
+def envelope_indices(buckets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    形状(..., 区間数, 区間の大きさ)の配列から、区間毎の最小値・最大値の位置を時系列順（先, 後）に返す。
+    '''
+    i_min = buckets.argmin(axis=-1)
+    i_max = buckets.argmax(axis=-1)
+    return np.minimum(i_min, i_max), np.maximum(i_min, i_max)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, out_count: int) -> tuple[np.ndarray, np.ndarray]:
+    '''
+    LTTB(Largest-Triangle-Three-Buckets)でout_count点に間引く。
+
+    区間毎の処理を一括で行うため、三角形の頂点には前の区間で選んだ点の代わりに前の区間の平均を用いる。
+    '''
+    n = len(x)
+    if out_count < 3 or n <= out_count:
+        return x, y
+    # 先頭と末尾の点は必ず残し、残りの点をout_count-2個の区間に分ける
+    edges = np.linspace(1, n - 1, out_count - 1).astype(np.int64)
+    bucket_len = np.diff(edges)
+    x_mid = x[1:n - 1].astype(np.float64)
+    y_mid = y[1:n - 1].astype(np.float64)
+    starts = edges[:-1] - 1
+    x_mean = np.add.reduceat(x_mid, starts) / bucket_len
+    y_mean = np.add.reduceat(y_mid, starts) / bucket_len
+
+    # 各区間の前後の点（前の区間の平均、次の区間の平均）
+    ax = np.concatenate([[x[0]], x_mean[:-1]])
+    ay = np.concatenate([[y[0]], y_mean[:-1]])
+    cx = np.concatenate([x_mean[1:], [x[-1]]])
+    cy = np.concatenate([y_mean[1:], [y[-1]]])
+    bucket_id = np.repeat(np.arange(len(bucket_len)), bucket_len)
+    area = np.abs((ax[bucket_id] - cx[bucket_id]) * (y_mid - ay[bucket_id]) -
+                  (ax[bucket_id] - x_mid) * (cy[bucket_id] - ay[bucket_id]))
+
+    # 区間毎に面積が最大の点を選ぶ
+    order = np.lexsort((-area, bucket_id))
+    selected = order[starts] + 1
+    indices = np.concatenate([[0], selected, [n - 1]])
+    return x[indices], y[indices]
+
+
+class EnvelopeDecimator:
+    '''
+    RingBufferのビューを最小値・最大値の包絡線に間引く。
+
+    区間はサンプルの通し番号で固定するため、完成した区間の結果は変わらない。
+    結果をキャッシュし、新たに完成した区間のみを計算する。
+    '''
+
+    def __init__(self, capacity: int, line_count: int, pixel_count: int) -> None:
+        '''
+        引数:
+
+        * capacity 間引く対象（RingBuffer）の最大サンプル数。
+        * line_count 線の数。
+        * pixel_count 横軸の画素数。区間の数の目安とする。
+        '''
+        self.line_count: int = line_count
+        self.bucket_size: int = max(1, -(-capacity // max(pixel_count, 1)))
+        self.max_buckets: int = capacity // self.bucket_size + 2
+        # 区間毎の(先, 後)の点。区間の通し番号をmax_bucketsで割った余りの位置に保持する。
+        self.cache_x: np.ndarray = np.empty((line_count, self.max_buckets, 2))
+        self.cache_y: np.ndarray = np.empty((line_count, self.max_buckets, 2))
+        # 次に計算する区間の通し番号
+        self.next_bucket: int = 0
+
+    def decimate(self, x: np.ndarray, ys: np.ndarray, total_count: int) -> list[tuple[np.ndarray, np.ndarray]]:
+        '''
+        線毎に(横軸, 縦軸)の間引いた配列を返す。
+
+        引数:
+
+        * x 横軸のデータ（RingBuffer.view()の1列）。
+        * ys 形状(線の数, サンプル数)の縦軸のデータ。
+        * total_count これまでに追加されたサンプルの総数（RingBuffer.total_count）。
+        '''
+        n = len(x)
+        size = self.bucket_size
+        if size == 1:
+            return [(x, ys[i]) for i in range(0, self.line_count)]
+        window_start = total_count - n
+        # ウィンドウに完全に含まれる区間の範囲[first, last)
+        first = -(-window_start // size)
+        last = total_count // size
+        if last <= first:
+            return [(x, ys[i]) for i in range(0, self.line_count)]
+
+        # 新たに完成した区間のみを計算してキャッシュする
+        new_first = max(self.next_bucket, first)
+        if new_first < last:
+            start = new_first * size - window_start
+            end = last * size - window_start
+            buckets = ys[:, start:end].reshape(self.line_count, last - new_first, size)
+            i_first, i_second = envelope_indices(buckets)
+            offsets = start + np.arange(last - new_first) * size
+            slots = np.arange(new_first, last) % self.max_buckets
+            for i in range(0, self.line_count):
+                for j, local in enumerate((i_first[i] + offsets, i_second[i] + offsets)):
+                    self.cache_x[i, slots, j] = x[local]
+                    self.cache_y[i, slots, j] = ys[i, local]
+            self.next_bucket = last
+
+        # 区間に満たない先頭・末尾のサンプルはそのまま残す
+        head_end = first * size - window_start
+        tail_start = last * size - window_start
+        slots = np.arange(first, last) % self.max_buckets
+        result: list[tuple[np.ndarray, np.ndarray]] = []
+        for i in range(0, self.line_count):
+            result.append((
+                np.concatenate([x[:head_end], self.cache_x[i, slots].ravel(), x[tail_start:]]),
+                np.concatenate([ys[i, :head_end], self.cache_y[i, slots].ravel(), ys[i, tail_start:]])))
+        return result
@@ -0,0 +1,155 @@
+import time
+from typing import Sequence
+import numpy as np
+from matplotlib.axes import Axes
+from matplotlib.backend_bases import DrawEvent
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+
+
+class PlotRenderer:
+    '''
+    目標フレームレートで時系列グラフを描画する。
+
+    * 前回のフレームから届いたサンプルはまとめて1回で描画する。
+    * 軸と背景はキャッシュし、線のみをblitで再描画する。（Axesの範囲のみを更新する為、同じFigureの別のAxesにも別のPlotRendererを使える）
+    * データが現在の表示範囲から外れた時のみ軸を更新し、背景ごと再描画する。
+    '''
+
+    def __init__(self, fig: Figure, ax: Axes, line_count: int, target_fps: float = 30.0, margin: float = 0.25) -> None:
+        '''
+        引数:
+
+        * fig/ax 描画先のFigureとAxes。
+        * line_count 描画する線の数。
+        * target_fps 目標フレームレート。
+        * margin 軸を更新する時に、データ範囲に加える余白の割合。
+        '''
+        self.fig = fig
+        self.ax = ax
+        self.canvas = fig.canvas
+        self.frame_interval: float = 1.0 / target_fps
+        self.margin: float = margin
+        # blitに対応していないバックエンドでは、線も通常の描画対象とする
+        self.use_blit: bool = getattr(self.canvas, "supports_blit", False)
+        self.lines: list[Line2D] = [
+            ax.plot([], [], animated=self.use_blit)[0] for i in range(0, line_count)]
+        # 線を除いた描画結果（blitの背景）
+        self.background = None
+        self.canvas.mpl_connect("draw_event", self.on_draw)
+
+        # 計測値
+        self.last_frame_start: float = 0.0
+        self.frame_count: int = 0
+        self.full_redraw_count: int = 0
+        self.render_time: float = 0.0
+        self.frame_time: float = 0.0
+        self.total_render_time: float = 0.0
+
+    def on_draw(self, event: DrawEvent | None) -> None:
+        '''
+        背景ごと再描画された時に背景をキャッシュし、線を描画する。
+        '''
+        if self.use_blit:
+            self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+            self.draw_lines()
+
+    def draw_lines(self) -> None:
+        for line in self.lines:
+            self.ax.draw_artist(line)
+
+    def frame_due(self) -> bool:
+        '''
+        次のフレームを描画する時刻になったかを返す。
+        '''
+        return time.perf_counter() - self.last_frame_start >= self.frame_interval
+
+    def wait_next_frame(self) -> None:
+        '''
+        GUIのイベントを処理しながら、次のフレームを描画する時刻まで待つ。
+        '''
+        remaining = self.frame_interval - (time.perf_counter() - self.last_frame_start)
+        if remaining > 0:
+            self.canvas.start_event_loop(remaining)
+        else:
+            self.canvas.flush_events()
+
+    def update_limits(self, x_range: tuple[float, float], y_range: tuple[float, float]) -> bool:
+        '''
+        データが表示範囲から外れた場合に軸を更新し、更新したかを返す。
+        '''
+        changed = False
+        x_start, x_end = x_range
+        xlim = self.ax.get_xlim()
+        if x_end > xlim[1] or x_start < xlim[0]:
+            span = max(x_end - x_start, 1e-12)
+            self.ax.set_xlim(x_start, x_start + span * (1 + self.margin))
+            changed = True
+
+        y_min, y_max = y_range
+        if not (np.isfinite(y_min) and np.isfinite(y_max)):
+            # infやNaNを含む場合（派生データ列の0での除算など）は縦軸を更新しない
+            return changed
+        ylim = self.ax.get_ylim()
+        y_span = max(y_max - y_min, 1e-12)
+        # データが範囲から外れた場合に加え、範囲に比べてデータが小さくなりすぎた場合も更新する
+        if y_max > ylim[1] or y_min < ylim[0] or y_span * (1 + 2 * self.margin) * 4 < ylim[1] - ylim[0]:
+            pad = y_span * self.margin
+            self.ax.set_ylim(y_min - pad, y_max + pad)
+            changed = True
+        return changed
+
+    def render(self, x: np.ndarray, ys: Sequence[np.ndarray],
+               x_range: tuple[float, float], y_range: tuple[float, float]) -> None:
+        '''
+        横軸を共有する線を1フレーム分描画する。
+
+        引数:
+
+        * x 横軸のデータ。
+        * ys 線毎の縦軸のデータ。
+        * x_range/y_range 描画するデータの範囲（最小値, 最大値）。
+        '''
+        self.render_lines([(x, y) for y in ys], x_range, y_range)
+
+    def render_lines(self, line_data: Sequence[tuple[np.ndarray, np.ndarray]],
+                     x_range: tuple[float, float], y_range: tuple[float, float]) -> None:
+        '''
+        線毎に(横軸, 縦軸)のデータを受け、1フレーム分描画する。間引いたデータなど、線毎に横軸が異なる場合に用いる。
+        '''
+        start = time.perf_counter()
+        if self.last_frame_start > 0:
+            self.frame_time = start - self.last_frame_start
+        self.last_frame_start = start
+
+        for line, (x, y) in zip(self.lines, line_data):
+            line.set_data(x, y)
+
+        if self.update_limits(x_range, y_range) or (self.use_blit and self.background == None):
+            # 軸が変わったので背景ごと再描画する（draw_eventで背景をキャッシュする）
+            self.full_redraw_count += 1
+            self.canvas.draw()
+        elif self.use_blit:
+            self.canvas.restore_region(self.background)
+            self.draw_lines()
+            self.canvas.blit(self.ax.bbox)
+        else:
+            self.canvas.draw_idle()
+        self.canvas.flush_events()
+
+        self.render_time = time.perf_counter() - start
+        self.total_render_time += self.render_time
+        self.frame_count += 1
+
+    def stats(self) -> dict[str, float]:
+        '''
+        描画の計測値を返す。時間の単位は秒。
+        '''
+        return {
+            "frames": self.frame_count,
+            "full_redraws": self.full_redraw_count,
+            "render_time": self.render_time,
+            "frame_time": self.frame_time,
+            "fps": 1.0 / self.frame_time if self.frame_time > 0 else 0.0,
+            "mean_render_time": self.total_render_time / self.frame_count if self.frame_count > 0 else 0.0,
+        }
@@ -0,0 +1,133 @@
+import numpy as np
+
+
+class RingBuffer:
+    '''
+    固定長のサンプル列を保持するリングバッファ。
+
+    * 列毎に連続したfloat64配列（列優先）でデータを保持する。
+    * push()は1サンプルあたりO(1)、extend()はまとめて書き込む。
+    * 同じデータを2周分の領域に2重に書き込むことで、古い順に並んだビューをコピー無しで返す。
+    * 一定数のサンプル毎（ブロック毎）に最小値・最大値を保持し、書き換えられたブロックのみ再計算する。
+    '''
+
+    def __init__(self, capacity: int, col_count: int, block_size: int = 1024) -> None:
+        '''
+        引数:
+
+        * capacity 保持するサンプル数の上限。
+        * col_count 1サンプルあたりの列数。
+        * block_size 最小値・最大値を保持するブロックのサンプル数。
+        '''
+        if capacity <= 0:
+            raise ValueError("capacity must be positive.")
+        self.capacity: int = capacity
+        self.col_count: int = col_count
+        self.block_size: int = block_size
+        self.data: np.ndarray = np.zeros((col_count, 2 * capacity), dtype=np.float64)
+        # 次に書き込む位置
+        self.pos: int = 0
+        # 保持しているサンプル数
+        self.count: int = 0
+        # これまでに追加したサンプルの総数
+        self.total_count: int = 0
+
+        block_count = (capacity + block_size - 1) // block_size
+        self.block_min: np.ndarray = np.full((col_count, block_count), np.inf)
+        self.block_max: np.ndarray = np.full((col_count, block_count), -np.inf)
+        # 書き換えられ、最小値・最大値の再計算が必要なブロック
+        self.dirty_blocks: set[int] = set()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def clear(self) -> None:
+        self.pos = 0
+        self.count = 0
+        self.block_min.fill(np.inf)
+        self.block_max.fill(-np.inf)
+        self.dirty_blocks.clear()
+
+    def push(self, row) -> None:
+        '''
+        1サンプル（列数分の値）を追加する。
+        '''
+        self.data[:, self.pos] = row
+        self.data[:, self.pos + self.capacity] = row
+        self.dirty_blocks.add(self.pos // self.block_size)
+        self.pos += 1
+        if self.pos >= self.capacity:
+            self.pos = 0
+        if self.count < self.capacity:
+            self.count += 1
+        self.total_count += 1
+
+    def extend(self, rows: np.ndarray) -> None:
+        '''
+        形状(サンプル数, 列数)の配列をまとめて追加する。
+        '''
+        rows = np.asarray(rows, dtype=np.float64)
+        n = len(rows)
+        if n == 0:
+            return
+        self.total_count += n
+        if n >= self.capacity:
+            # バッファ全体が書き換わる場合は、最新のcapacityサンプルのみを書き込む
+            columns = rows[-self.capacity:].T
+            self.data[:, :self.capacity] = columns
+            self.data[:, self.capacity:] = columns
+            self.pos = 0
+            self.count = self.capacity
+            self.dirty_blocks.update(range(self.block_min.shape[1]))
+            return
+
+        columns = rows.T
+        first = min(n, self.capacity - self.pos)
+        self.write_segment(self.pos, columns[:, :first])
+        if first < n:
+            self.write_segment(0, columns[:, first:])
+        self.pos = (self.pos + n) % self.capacity
+        self.count = min(self.count + n, self.capacity)
+
+    def write_segment(self, start: int, columns: np.ndarray) -> None:
+        '''
+        折り返しの無い区間に書き込み、該当するブロックを再計算対象にする。
+        '''
+        end = start + columns.shape[1]
+        self.data[:, start:end] = columns
+        self.data[:, start + self.capacity:end + self.capacity] = columns
+        self.dirty_blocks.update(
+            range(start // self.block_size, (end - 1) // self.block_size + 1))
+
+    def view(self) -> np.ndarray:
+        '''
+        保持しているサンプルを古い順に並べた、形状(列数, サンプル数)のビューを返す。
+        ビューは次にpush()/extend()するまでの間だけ有効である。
+        '''
+        end = self.pos + self.capacity
+        return self.data[:, end - self.count:end]
+
+    def latest(self) -> np.ndarray:
+        '''
+        最新のサンプルを返す。
+        '''
+        return self.data[:, self.pos + self.capacity - 1]
+
+    def min_max(self) -> tuple[np.ndarray, np.ndarray]:
+        '''
+        保持しているサンプルの列毎の最小値・最大値を返す。
+        書き換えられたブロックのみを再計算する。
+        '''
+        valid_end = self.count if self.count < self.capacity else self.capacity
+        for b in self.dirty_blocks:
+            start = b * self.block_size
+            end = min(start + self.block_size, valid_end)
+            if end <= start:
+                self.block_min[:, b] = np.inf
+                self.block_max[:, b] = -np.inf
+                continue
+            block = self.data[:, start:end]
+            self.block_min[:, b] = block.min(axis=1)
+            self.block_max[:, b] = block.max(axis=1)
+        self.dirty_blocks.clear()
+        return self.block_min.min(axis=1), self.block_max.max(axis=1)
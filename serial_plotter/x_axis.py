@@ -0,0 +1,123 @@
+from enum import Enum
+import numpy as np
+from serial_plotter.ring_buffer import RingBuffer
+
+
+class XAxisMode(Enum):
+    '''
+    横軸に用いる値を指定する。
+    '''
+    # データ列のいずれか
+    FIELD = 1
+    # サンプルの通し番号
+    SAMPLE_COUNT = 2
+    # ホストの受信時刻
+    HOST_TIME = 3
+
+
+class XAxisSelector:
+    '''
+    デコード済みのサンプルから横軸の値を作成する。
+
+    * FIELDで周期的に0に戻るカウンタ（uint16のティックなど）を指定した場合は、桁あふれを補正して連続した値にする。
+    * 横軸は単調増加にする。前の値より小さい値は前の値に揃え、non_monotonic_countに数える。
+    '''
+
+    def __init__(self, mode: XAxisMode = XAxisMode.FIELD, field_index: int = 0,
+                 wrap_bits: int | None = None, scale: float = 1.0) -> None:
+        '''
+        引数:
+
+        * mode 横軸に用いる値。
+        * field_index modeがFIELDの場合に横軸とするデータ列のインデックス。
+        * wrap_bits 横軸とするデータ列が周期的に0に戻るカウンタの場合のビット数。
+        * scale 横軸の値に掛ける係数（ティックを秒に変換する場合など）。
+        '''
+        self.mode: XAxisMode = mode
+        self.field_index: int = field_index
+        self.wrap_bits: int | None = wrap_bits
+        self.scale: float = scale
+        self.sample_count: int = 0
+        # 直前のサンプルのカウンタの値と、補正後の横軸の値
+        self.last_raw: float | None = None
+        self.last_unwrapped: float = 0.0
+        self.last_x: float = -np.inf
+        self.start_time: float | None = None
+        self.non_monotonic_count: int = 0
+
+    def make_x(self, values: np.ndarray, times: np.ndarray | None = None) -> np.ndarray:
+        '''
+        形状(サンプル数, 列数)のサンプルから横軸の値を作成する。
+        modeがHOST_TIMEの場合は、timesにサンプル毎の受信時刻を指定する。
+        '''
+        n = len(values)
+        if self.mode == XAxisMode.SAMPLE_COUNT:
+            x = np.arange(self.sample_count, self.sample_count + n, dtype=np.float64)
+        elif self.mode == XAxisMode.HOST_TIME:
+            if times is None:
+                raise ValueError("Receive times are required for XAxisMode.HOST_TIME.")
+            if self.start_time == None and n > 0:
+                self.start_time = float(times[0])
+            x = np.asarray(times, dtype=np.float64) - (self.start_time or 0.0)
+        else:
+            x = self.unwrap(np.asarray(values[:, self.field_index], dtype=np.float64))
+        self.sample_count += n
+        if n == 0:
+            return x
+        x = x * self.scale if self.scale != 1.0 else x
+
+        # 単調増加にする
+        monotonic = np.maximum.accumulate(np.concatenate([[self.last_x], x]))[1:]
+        self.non_monotonic_count += int(np.count_nonzero(x < monotonic))
+        self.last_x = float(monotonic[-1])
+        return monotonic
+
+    def unwrap(self, raw: np.ndarray) -> np.ndarray:
+        '''
+        周期的に0に戻るカウンタの値を連続した値にする。
+        '''
+        if self.wrap_bits == None or len(raw) == 0:
+            return raw
+        modulus = float(1 << self.wrap_bits)
+        half = modulus / 2
+        prev = raw[0] if self.last_raw == None else self.last_raw
+        # 前のサンプルからの差を(-半周期, 半周期]に収め、累積する
+        diff = np.diff(np.concatenate([[prev], raw]))
+        diff = (diff + half) % modulus - half
+        base = raw[0] if self.last_raw == None else self.last_unwrapped
+        unwrapped = base + np.cumsum(diff)
+        self.last_raw = float(raw[-1])
+        self.last_unwrapped = float(unwrapped[-1])
+        return unwrapped
+
+
+class MonotonicXIndex:
+    '''
+    列0に単調増加する横軸を持つRingBufferから、横軸の範囲に含まれるサンプルを二分探索で取り出す。
+    '''
+
+    def __init__(self, ring_buffer: RingBuffer) -> None:
+        self.ring_buffer = ring_buffer
+
+    def range_of(self, x_start: float, x_end: float) -> tuple[int, int]:
+        '''
+        横軸が[x_start, x_end]に含まれるサンプルの、view()内の範囲[start, stop)を返す。
+        '''
+        x = self.ring_buffer.view()[0]
+        return int(np.searchsorted(x, x_start, side="left")), int(np.searchsorted(x, x_end, side="right"))
+
+    def view_range(self, x_start: float, x_end: float) -> np.ndarray:
+        '''
+        横軸が[x_start, x_end]に含まれるサンプルの、形状(列数, サンプル数)のビューを返す。
+        '''
+        start, stop = self.range_of(x_start, x_end)
+        return self.ring_buffer.view()[:, start:stop]
+
+    def view_latest(self, x_width: float) -> np.ndarray:
+        '''
+        最新のサンプルから横軸でx_widthの範囲に含まれるサンプルのビューを返す。
+        '''
+        if len(self.ring_buffer) == 0:
+            return self.ring_buffer.view()
+        x_end = self.ring_buffer.latest()[0]
+        return self.view_range(x_end - x_width, x_end)
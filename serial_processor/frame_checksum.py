@@ -0,0 +1,44 @@
+import binascii
+import zlib
+import numpy as np
+
+# 1サンプル分のデータ列の後ろに付加するチェックサムの種類毎のバイト数
+# * sum8: データ列の各バイトの和の下位8ビット
+# * xor8: データ列の各バイトの排他的論理和
+# * crc16: CRC-16/CCITT-FALSE（多項式0x1021、初期値0xFFFF）
+# * crc32: CRC-32（zlib.crc32と同じ）
+CHECKSUM_SIZE: dict[str, int] = {"sum8": 1, "xor8": 1, "crc16": 2, "crc32": 4}
+
+
+def compute_checksum(checksum: str, payload: bytes | bytearray | memoryview) -> int:
+    '''
+    データ列のチェックサムを計算する。
+    '''
+    if checksum == "sum8":
+        return sum(payload) & 0xFF
+    if checksum == "xor8":
+        return int(np.bitwise_xor.reduce(np.frombuffer(payload, dtype=np.uint8), initial=0))
+    if checksum == "crc16":
+        return binascii.crc_hqx(payload, 0xFFFF)
+    if checksum == "crc32":
+        return zlib.crc32(payload)
+    raise ValueError("Unknown checksum. checksum:{}".format(checksum))
+
+
+def verify_checksums(checksum: str, frame_matrix: np.ndarray, byteorder: str) -> np.ndarray:
+    '''
+    形状(サンプル数, 1サンプル分のバイト数)のuint8配列の各行について、末尾のチェックサムが一致するかを返す。
+    sum8/xor8はまとめて計算し、crc16/crc32は1サンプル毎にbinascii/zlibで計算する。
+    '''
+    size = CHECKSUM_SIZE[checksum]
+    payload = frame_matrix[:, :-size]
+    trailer = frame_matrix[:, -size:]
+    if checksum == "sum8":
+        return (payload.sum(axis=1, dtype=np.uint64) & 0xFF) == trailer[:, 0]
+    if checksum == "xor8":
+        return np.bitwise_xor.reduce(payload, axis=1) == trailer[:, 0]
+    expected = np.frombuffer(np.ascontiguousarray(trailer).tobytes(),
+                             dtype=(">u" if byteorder == "big" else "<u") + str(size))
+    actual = np.fromiter((compute_checksum(checksum, row.tobytes()) for row in payload),
+                         dtype=np.uint64, count=len(payload))
+    return actual == expected
@@ -0,0 +1,102 @@
+import time
+from typing import Protocol
+
+
+class StageTimer:
+    '''
+    処理時間を計測する。計測自体が処理を遅くしないよう、every回に1回だけ計測する。
+
+    使用例:
+
+        t = timer.start()
+        （計測する処理）
+        timer.stop(t)
+    '''
+
+    def __init__(self, every: int = 16) -> None:
+        self.every: int = every
+        self.call_count: int = 0
+        self.sample_count: int = 0
+        self.total_time: float = 0.0
+        self.max_time: float = 0.0
+        self.last_time: float = 0.0
+
+    def start(self) -> float | None:
+        '''
+        計測を開始する。今回計測しない場合はNoneを返す。
+        '''
+        self.call_count += 1
+        if self.call_count % self.every != 0:
+            return None
+        return time.perf_counter()
+
+    def stop(self, start: float | None) -> None:
+        if start == None:
+            return
+        elapsed = time.perf_counter() - start
+        self.sample_count += 1
+        self.total_time += elapsed
+        self.last_time = elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+
+    def stats(self, prefix: str = "") -> dict[str, float]:
+        '''
+        計測値を、キーの先頭にprefixをつけて返す。時間の単位は秒。
+        '''
+        return {
+            prefix + "calls": self.call_count,
+            prefix + "mean_time": self.total_time / self.sample_count if self.sample_count > 0 else 0.0,
+            prefix + "max_time": self.max_time,
+            prefix + "last_time": self.last_time,
+        }
+
+
+class StatsSource(Protocol):
+    '''
+    stats()で計測値を返す構成要素（SerialReader、パイプライン、PlotRendererなど）
+    '''
+
+    def stats(self) -> dict[str, float]:
+        ...
+
+
+class PipelineStats:
+    '''
+    受信からデコード、描画までの各段の計測値をまとめて取得する。
+    '''
+
+    def __init__(self) -> None:
+        self.sources: dict[str, StatsSource] = {}
+
+    def add(self, name: str, source: StatsSource) -> None:
+        '''
+        計測値を取得する構成要素を名前をつけて登録する。
+        '''
+        self.sources[name] = source
+
+    def snapshot(self) -> dict[str, float]:
+        '''
+        登録した構成要素の計測値を"名前.項目"をキーとする1つの辞書にまとめて返す。
+        '''
+        result: dict[str, float] = {}
+        for name, source in self.sources.items():
+            for key, value in source.stats().items():
+                result[name + "." + key] = value
+        return result
+
+    def format_line(self, snapshot: dict[str, float] | None = None) -> str:
+        '''
+        計測値を1行のテキストに整形する。時間はミリ秒で表示する。
+        '''
+        if snapshot == None:
+            snapshot = self.snapshot()
+        items: list[str] = []
+        for key, value in snapshot.items():
+            if key.endswith("_time"):
+                items.append("{}={:.3f}ms".format(key, value * 1000))
+            elif isinstance(value, float):
+                items.append("{}={:.3g}".format(key, value))
+            else:
+                items.append("{}={}".format(key, value))
+        return " ".join(items)
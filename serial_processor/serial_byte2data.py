@@ -2,6 +2,8 @@ from enum import Enum
 import re
 import struct
 import sys
+import numpy as np
+from serial_processor.frame_checksum import CHECKSUM_SIZE, compute_checksum, verify_checksums
 
 
 class VariousDataEndian(Enum):
@@ -27,20 +29,74 @@ class VariousDataType(Enum):
     FP = 31
 
 
+# structモジュールの書式文字（固定小数点型は対応する書式が無い）
+STRUCT_FORMAT: dict[VariousDataType, str] = {
+    VariousDataType.UINT8: "B",
+    VariousDataType.UINT16: "H",
+    VariousDataType.UINT32: "I",
+    VariousDataType.UINT64: "Q",
+    VariousDataType.INT8: "b",
+    VariousDataType.INT16: "h",
+    VariousDataType.INT32: "i",
+    VariousDataType.INT64: "q",
+    VariousDataType.FLOAT: "f",
+    VariousDataType.DOUBLE: "d",
+}
+
+# 固定小数点型の値を格納するバイト数毎の、struct/NumPyの符号なし整数の書式
+# （1/2/4/8バイト以外はバイト列として取り出して変換する）
+FP_STRUCT_FORMAT: dict[int, str] = {1: "B", 2: "H", 4: "I", 8: "Q"}
+FP_NUMPY_FORMAT: dict[int, str] = {1: "u1", 2: "u2", 4: "u4", 8: "u8"}
+
+# NumPyのdtype文字列（エンディアン記号を除く）
+NUMPY_FORMAT: dict[VariousDataType, str] = {
+    VariousDataType.UINT8: "u1",
+    VariousDataType.UINT16: "u2",
+    VariousDataType.UINT32: "u4",
+    VariousDataType.UINT64: "u8",
+    VariousDataType.INT8: "i1",
+    VariousDataType.INT16: "i2",
+    VariousDataType.INT32: "i4",
+    VariousDataType.INT64: "i8",
+    VariousDataType.FLOAT: "f4",
+    VariousDataType.DOUBLE: "f8",
+}
+
+
+def endian_prefix(endian: VariousDataEndian) -> str:
+    '''
+    struct/NumPyの書式で用いるエンディアン記号を返す。
+    '''
+    return ">" if endian == VariousDataEndian.BIGENDIAN else "<"
+
+
+def endian_byteorder(endian: VariousDataEndian) -> str:
+    '''
+    int.from_bytes()/int.to_bytes()で用いるバイトオーダーを返す。
+    '''
+    return "big" if endian == VariousDataEndian.BIGENDIAN else "little"
+
+
 class VariousData:
     '''
     SerialByteProcessor型が保持する多種型クラス。
     uint8やfloat型を指定して、バイトを入力することで、値が取り出せる。
     '''
 
-    def __init__(self, type_format: VariousDataType, endian: VariousDataEndian, fp_word: int = 0, fp_fraction: int = 0) -> None:
+    def __init__(self, type_format: VariousDataType, endian: VariousDataEndian, fp_word: int = 0, fp_fraction: int = 0,
+                 fp_signed: bool = True) -> None:
         '''
         引数
         type_format: 扱う型を指定する。
-        fp_word/fp_fraction: type_formatにFP（固定小数点型）が選択された時のデータ長と小数部の長さを指定する。
+        fp_word/fp_fraction: type_formatにFP（固定小数点型）が選択された時のデータ長と小数部の長さをビット数で指定する。
+        fp_signed: type_formatにFP（固定小数点型）が選択された時に符号つきかを指定する。
+
+        固定小数点型はfp_wordビットを格納できる最小のバイト数で送られ、下位fp_wordビットを値とする。
         '''
         self.bytes_length = 0
+        self.fp_word = 0
         self.fp_fraction = 0
+        self.fp_signed = fp_signed
         self.endian = endian
         self.is_empty_bytes: bool = True
         self.bytes_data: bytes = b"\x00"
@@ -87,12 +143,28 @@ class VariousData:
 
         elif type_format == VariousDataType.FP:  # 固定小数点型
             self.type_format = type_format
-            self.bytes_length = fp_word
+            self.bytes_length = (fp_word + 7) // 8
+            self.fp_word = fp_word
             self.fp_fraction = fp_fraction
 
         else:
             raise NameError("VariousData type Error")
 
+        # 1データ分の書式（固定小数点型は値を格納する符号なし整数、またはバイト列の書式）
+        if self.type_format == VariousDataType.FP:
+            self.struct_format: str = FP_STRUCT_FORMAT.get(
+                self.bytes_length, "{}s".format(self.bytes_length))
+            self.numpy_format: str = FP_NUMPY_FORMAT.get(
+                self.bytes_length, "V{}".format(self.bytes_length))
+        else:
+            self.struct_format = STRUCT_FORMAT[self.type_format]
+            self.numpy_format = NUMPY_FORMAT[self.type_format]
+        # 1データ分の変換器。固定小数点型はNone
+        self.struct: struct.Struct | None = None
+        if self.type_format in STRUCT_FORMAT:
+            self.struct = struct.Struct(
+                endian_prefix(endian) + STRUCT_FORMAT[self.type_format])
+
     def clear_byte(self):
         '''
         溜め込んでいるバイトデータをクリアする。
@@ -112,52 +184,52 @@ class VariousData:
             self.bytes_data += b
         if len(self.bytes_data) >= self.bytes_length:
             # データが完成、指定された型に変換して戻り値に返す。
-            if self.type_format == VariousDataType.UINT8 or \
-                    self.type_format == VariousDataType.UINT16 or \
-                    self.type_format == VariousDataType.UINT32 or \
-                    self.type_format == VariousDataType.UINT64:
-
-                if self.endian == VariousDataEndian.BIGENDIAN:
-                    self.is_empty_bytes = True
-                    return int.from_bytes(self.bytes_data, byteorder='big', signed=False)
-                else:
-                    self.is_empty_bytes = True
-                    return int.from_bytes(self.bytes_data, byteorder='little', signed=False)
-
-            elif self.type_format == VariousDataType.INT8 or \
-                    self.type_format == VariousDataType.INT16 or \
-                    self.type_format == VariousDataType.INT32 or \
-                    self.type_format == VariousDataType.INT64:
-
-                if self.endian == VariousDataEndian.BIGENDIAN:
-                    self.is_empty_bytes = True
-                    return int.from_bytes(self.bytes_data, byteorder='big', signed=True)
-                else:
-                    self.is_empty_bytes = True
-                    return int.from_bytes(self.bytes_data, byteorder='little', signed=True)
-
-            elif self.type_format == VariousDataType.FLOAT:
-
-                if self.endian == VariousDataEndian.BIGENDIAN:
-                    self.is_empty_bytes = True
-                    return struct.unpack(">f", self.bytes_data)[0]
-                else:
-                    self.is_empty_bytes = True
-                    return struct.unpack("<f", self.bytes_data)[0]
-
-            elif self.type_format == VariousDataType.DOUBLE:
-
-                if self.endian == VariousDataEndian.BIGENDIAN:
-                    self.is_empty_bytes = True
-                    return struct.unpack(">d", self.bytes_data)[0]
-                else:
-                    self.is_empty_bytes = True
-                    return struct.unpack("<d", self.bytes_data)[0]
+            self.is_empty_bytes = True
+            if self.struct != None:
+                return self.struct.unpack(self.bytes_data)[0]
             else:
-                # TODO: 固定小数点 → float型に変換する処理を書く
-                pass
+                return self.fp_value(self.bytes_data)
         return None
 
+    def fp_value(self, raw: int | bytes) -> float:
+        '''
+        固定小数点型の値を格納した整数、またはバイト列をfloat型に変換する。
+        '''
+        if not isinstance(raw, int):
+            raw = int.from_bytes(
+                raw, byteorder=endian_byteorder(self.endian), signed=False)
+        raw &= (1 << self.fp_word) - 1
+        if self.fp_signed and raw >= 1 << (self.fp_word - 1):
+            raw -= 1 << self.fp_word
+        return raw * 2.0 ** -self.fp_fraction
+
+    def fp_array(self, raw: np.ndarray) -> np.ndarray:
+        '''
+        固定小数点型の値を格納した符号なし整数、またはバイト列（void型）の配列をまとめてfloat64の配列に変換する。
+        '''
+        if raw.dtype.kind == "V":
+            # 1/2/4/8バイト以外はバイト毎に分けて、上位のバイトから整数を組み立てる
+            byte_matrix = np.frombuffer(raw.tobytes(), dtype=np.uint8).reshape(len(raw), self.bytes_length)
+            if self.endian == VariousDataEndian.LITTLEENDIAN:
+                byte_matrix = byte_matrix[:, ::-1]
+            value = np.zeros(len(raw), dtype=np.uint64)
+            for i in range(0, self.bytes_length):
+                value = (value << np.uint64(8)) | byte_matrix[:, i]
+        else:
+            value = raw.astype(np.uint64)
+
+        if self.fp_word < 64:
+            value &= np.uint64((1 << self.fp_word) - 1)
+        if self.fp_signed:
+            if self.fp_word < 64:
+                # 符号ビットで符号拡張する
+                sign = np.int64(1 << (self.fp_word - 1))
+                signed_value = (value.astype(np.int64) ^ sign) - sign
+            else:
+                signed_value = value.view(np.int64)
+            return signed_value * 2.0 ** -self.fp_fraction
+        return value * 2.0 ** -self.fp_fraction
+
 
 class SerialByte2Data:
 
@@ -165,7 +237,7 @@ class SerialByte2Data:
     serial通信で得られたプロトコルによるバイト列からデータへ変換する。
     '''
 
-    def __init__(self, data_format_list: list[str], endian: VariousDataEndian) -> None:
+    def __init__(self, data_format_list: list[str], endian: VariousDataEndian, checksum: str | None = None) -> None:
         '''
         format_listは、1サンプルで送られてくるデータ列を指定する。
         例:
@@ -174,12 +246,18 @@ class SerialByte2Data:
         * uint8/16/32/64: 符号なし整数型 8/16/32/64ビット
         * int8/16/32/64: 符号つき整数型 8/16/32/64ビット
         * float/double: 浮動小数点型 32/64ビット
-        * fp{X}q{Y}: 固定小数点型 X=ビット長 Y=小数部 例: fp32q16
+        * fp{X}q{Y}: 符号つき固定小数点型 X=ビット長(1~64) Y=小数部のビット長 例: fp32q16, fp16q15(Q15)
+        * ufp{X}q{Y}: 符号なし固定小数点型 例: ufp12q12
+        固定小数点型はXビットを格納できる最小のバイト数（fp12q8なら2バイト）で送られ、下位Xビットを値とする。
+
+        checksumを指定した場合、データ列の後ろにendianのバイトオーダーでチェックサムが付加されているものとする。
+        "sum8"/"xor8"/"crc16"/"crc32"を指定できる。（frame_checksum.CHECKSUM_SIZEを参照）
         '''
         # 1サンプル毎に送られてくるデータ列を保持するVariousData配列
         self.data_array: list[VariousData] = []
         # 現在変換を行っているデータのインデックス
         self.i_current_data: int = 0
+        self.endian: VariousDataEndian = endian
 
         for f in data_format_list:
             if f == "uint8":
@@ -214,7 +292,7 @@ class SerialByte2Data:
                     VariousDataType.DOUBLE, endian))
             else:
                 # 固定小数点か正規表現を用いて判定する
-                fp_t = re.fullmatch(r"(?i)FP(\d+)Q(\d+)", f)
+                fp_t = re.fullmatch(r"(?i)(U?)FP(\d+)Q(\d+)", f)
 
                 if fp_t == None:
                     # 正規表現が一致しない。
@@ -223,8 +301,15 @@ class SerialByte2Data:
                           file=sys.stderr)
                     sys.exit(1)
 
-                fp_word: int = int(fp_t.groups()[0])
-                fp_fraction: int = int(fp_t.groups()[1])
+                fp_signed: bool = fp_t.groups()[0] == ""
+                fp_word: int = int(fp_t.groups()[1])
+                fp_fraction: int = int(fp_t.groups()[2])
+
+                if fp_word < 1 or fp_word > 64:
+                    # 64ビットを超える固定小数点型は扱えない
+                    print("The length of the fixed-point must be 1 to 64 bits. type:{}".format(f),
+                          file=sys.stderr)
+                    sys.exit(1)
 
                 if fp_word < fp_fraction:
                     # 固定小数点長よりも小数部の方が長い場合
@@ -233,7 +318,36 @@ class SerialByte2Data:
                     sys.exit(1)
 
                 self.data_array.append(
-                    VariousData(VariousDataType.FP, endian, fp_word=fp_word, fp_fraction=fp_fraction))
+                    VariousData(VariousDataType.FP, endian, fp_word=fp_word, fp_fraction=fp_fraction, fp_signed=fp_signed))
+
+        if checksum != None and checksum not in CHECKSUM_SIZE:
+            print("Incorrect checksum. checksum:{}".format(checksum), file=sys.stderr)
+            sys.exit(1)
+        self.checksum: str | None = checksum
+
+        # 1サンプル分のデータ列をまとめて変換する書式をコンパイルする。
+        # 固定小数点型は値を格納する整数（またはバイト列）として取り出し、変換後にfloat型に変換する。
+        # チェックサムは読み飛ばす。
+        prefix = endian_prefix(endian)
+        # データ列のバイト数と、チェックサムを含む1サンプル分のバイト数
+        self.payload_size: int = sum(vd.bytes_length for vd in self.data_array)
+        self.checksum_size: int = CHECKSUM_SIZE[checksum] if checksum != None else 0
+        self.frame_size: int = self.payload_size + self.checksum_size
+        self.frame_struct: struct.Struct = struct.Struct(
+            prefix + "".join(vd.struct_format for vd in self.data_array) + "x" * self.checksum_size)
+        self.frame_dtype: np.dtype = np.dtype({
+            "names": ["f{}".format(i) for i in range(0, len(self.data_array))],
+            "formats": [prefix + vd.numpy_format for vd in self.data_array],
+            "itemsize": self.frame_size,
+        })
+        # 固定小数点型のデータのインデックス
+        self.fp_index_list: list[int] = [
+            i for i, vd in enumerate(self.data_array) if vd.type_format == VariousDataType.FP]
+        # まとめて変換したサンプル数
+        self.converted_frame_count: int = 0
+        # 長さ、チェックサムが一致せず破棄したサンプル数
+        self.wrong_length_frame_count: int = 0
+        self.checksum_error_count: int = 0
 
     def reset_translate(self):
         '''
@@ -247,12 +361,122 @@ class SerialByte2Data:
         '''
         バイトデータの入力を受け、変換を実施する。
         '''
+        if self.i_current_data >= len(self.data_array):
+            # 1サンプル分のデータ列を超えたバイトは無視する
+            return None
         result = self.data_array[self.i_current_data].read_byte(input_byte)
         if result == None:  # 変換中でデータが出力されない場合はNoneを返す。
             return None
         # 変換が実施され、データが出力された場合は、変換対象に次のデータを指定し、変換されたデータを返す。
         self.i_current_data += 1
-        if self.i_current_data >= len(self.data_array):
-            # self.i_current_data = 0
-            return None
         return result
+
+    def check_frame(self, frame: bytes | bytearray | memoryview) -> bool:
+        '''
+        制御文字を取り除いた1サンプル分のバイト列の長さとチェックサムを検証する。
+        '''
+        if len(frame) != self.frame_size:
+            self.wrong_length_frame_count += 1
+            return False
+        if self.checksum == None:
+            return True
+        expected = int.from_bytes(frame[self.payload_size:],
+                                  byteorder=endian_byteorder(self.endian))
+        if compute_checksum(self.checksum, frame[:self.payload_size]) != expected:
+            self.checksum_error_count += 1
+            return False
+        return True
+
+    def join_frames(self, frames: list[bytes]) -> bytes:
+        '''
+        制御文字を取り除いた1サンプル分のバイト列の配列から、長さとチェックサムが一致するものだけを連結して返す。
+        破棄したバイト列は後続のサンプルに影響しない。
+        '''
+        frame_size = self.frame_size
+        valid_frames = [f for f in frames if len(f) == frame_size]
+        self.wrong_length_frame_count += len(frames) - len(valid_frames)
+        joined = b"".join(valid_frames)
+        if self.checksum == None or len(valid_frames) == 0:
+            return joined
+        frame_matrix = np.frombuffer(joined, dtype=np.uint8).reshape(len(valid_frames), frame_size)
+        valid = verify_checksums(self.checksum, frame_matrix,
+                                 endian_byteorder(self.endian))
+        error_count = len(valid) - int(np.count_nonzero(valid))
+        if error_count == 0:
+            return joined
+        self.checksum_error_count += error_count
+        return frame_matrix[valid].tobytes()
+
+    def unpack_frame(self, frame: bytes | bytearray | memoryview) -> None | tuple:
+        '''
+        制御文字を取り除いた1サンプル分のバイト列をまとめて変換し、データのタプルを返す。
+        バイト列の長さ、またはチェックサムが一致しない場合はNoneを返す。
+        '''
+        if not self.check_frame(frame):
+            return None
+        self.converted_frame_count += 1
+        values = self.frame_struct.unpack_from(frame)
+        if len(self.fp_index_list) == 0:
+            return values
+        return self.convert_fp(values)
+
+    def convert_fp(self, values: tuple) -> tuple:
+        '''
+        structで取り出したタプルの固定小数点型のデータをfloat型に変換する。
+        '''
+        value_list = list(values)
+        for i in self.fp_index_list:
+            value_list[i] = self.data_array[i].fp_value(value_list[i])
+        return tuple(value_list)
+
+    def unpack_frames(self, frames: bytes | bytearray | memoryview) -> list[tuple]:
+        '''
+        1サンプル分のバイト列を連結したバイト列を変換し、サンプル毎のタプルの配列を返す。
+        '''
+        self.converted_frame_count += len(frames) // self.frame_size
+        if len(self.fp_index_list) == 0:
+            return list(self.frame_struct.iter_unpack(frames))
+        return [self.convert_fp(values) for values in self.frame_struct.iter_unpack(frames)]
+
+    def frames2array(self, frames: bytes | bytearray | memoryview) -> np.ndarray:
+        '''
+        1サンプル分のバイト列を連結したバイト列を、フィールド"f0", "f1", ...を持つNumPyの構造化配列に変換する。
+        固定小数点型を含まない場合、戻り値はframesを参照するビューである。
+        固定小数点型を含む場合は、固定小数点型のフィールドをfloat64に変換した配列を新たに作成する。
+        '''
+        records = np.frombuffer(frames, dtype=self.frame_dtype)
+        self.converted_frame_count += len(records)
+        if len(self.fp_index_list) == 0:
+            return records
+        values = np.empty(len(records), dtype=[
+            ("f{}".format(i), dt) for i, dt in enumerate(self.column_dtype_list())])
+        for i, vd in enumerate(self.data_array):
+            name = "f{}".format(i)
+            if i in self.fp_index_list:
+                values[name] = vd.fp_array(records[name])
+            else:
+                values[name] = records[name]
+        return values
+
+    def stats(self) -> dict[str, float]:
+        '''
+        計測値を返す。
+        '''
+        return {
+            "converted_frames": self.converted_frame_count,
+            "wrong_length_frames": self.wrong_length_frame_count,
+            "checksum_errors": self.checksum_error_count,
+            "frame_size": self.frame_size,
+        }
+
+    def column_dtype_list(self) -> list[np.dtype]:
+        '''
+        データ列毎の値の型（ネイティブのバイトオーダー）を返す。固定小数点型はfloat64となる。
+        '''
+        dtype_list: list[np.dtype] = []
+        for vd in self.data_array:
+            if vd.type_format in NUMPY_FORMAT:
+                dtype_list.append(np.dtype(NUMPY_FORMAT[vd.type_format]))
+            else:
+                dtype_list.append(np.dtype(np.float64))
+        return dtype_list
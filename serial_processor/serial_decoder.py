@@ -23,12 +23,29 @@ class SerialDecoder:
     * [DLE=0x10, N]        => エラー。Nは0x02/0x03/0x10ではない。実装上はデータNが入力されたことにする。,
     '''
 
-    def __init__(self, dle: bytes = b'\x10', stx: bytes = b'\x02', etx: bytes = b'\x03') -> None:
+    def __init__(self, dle: bytes = b'\x10', stx: bytes = b'\x02', etx: bytes = b'\x03',
+                 max_frame_length: int | None = None) -> None:
+        '''
+        max_frame_lengthを指定した場合、decode_buffer()は受信途中のフレームがこの長さを超えた時点で破棄し、
+        次の[DLE, STX]まで受信したバイトを読み飛ばす。
+        '''
         self.dle: bytes = dle
         self.stx: bytes = stx
         self.etx: bytes = etx
         self.state: SerialDecoderState = SerialDecoderState.STOP
         self.had_dle: bool = False
+        # decode_buffer()で複数回の呼び出しにまたがって受信途中のフレームを保持する
+        self.frame_buffer: bytearray = bytearray()
+        self.max_frame_length: int | None = max_frame_length
+        # 長すぎるフレームを破棄し、次の[DLE, STX]を待っているか
+        self.discarding: bool = False
+        # 計測値
+        self.input_byte_count: int = 0
+        self.frame_count: int = 0
+        # [DLE, N]（Nは0x02/0x03/0x10ではない）を受信した回数
+        self.protocol_error_count: int = 0
+        # max_frame_lengthを超えて破棄したフレームの数
+        self.oversized_frame_count: int = 0
 
     def decode(self, b: bytes) -> Tuple[SerialDecoderState, None | bytes]:
         '''
@@ -38,6 +55,7 @@ class SerialDecoder:
         * None|bytes    制御文字を取り除いたバイトデータを出力する。制御文字が入力された場合などはNoneを返す。
         '''
         data: None | bytes = None
+        self.input_byte_count += 1
 
         # 前回のステートに合わせてステートを更新
         if self.state == SerialDecoderState.START:
@@ -75,6 +93,7 @@ class SerialDecoder:
                 # 既にデータ入力が終了していた場合でもデータはNoneを返す。
                 self.had_dle = False
                 self.state = SerialDecoderState.FINISH
+                self.frame_count += 1
                 data = None
             else:
                 # ただのデータ0x03(ETX)としてデータを認識する
@@ -83,6 +102,7 @@ class SerialDecoder:
             # 前回の入力でDLEが入力されていたか
             if self.had_dle:
                 # [DLE, otherwise]はプロトコルとしてはエラーだが、実装上はotherwiseをdataとして読み込む
+                self.protocol_error_count += 1
                 data = b
             else:
                 data = b
@@ -93,3 +113,104 @@ class SerialDecoder:
             return (self.state, None)
 
         return (self.state, data)
+
+    def decode_buffer(self, buf: bytes | bytearray | memoryview) -> list[bytes]:
+        '''
+        バイト列をまとめて入力し、制御文字を取り除いた1サンプル分のデータ（フレーム）の配列を出力する。
+        decode()に1バイトずつ入力した場合と同じ動作をする。
+
+        * [DLE, STX]で受信途中のフレームを破棄し、新たなフレームを開始する。
+        * [DLE, ETX]でフレームが完成する。フレーム開始前に[DLE, ETX]が入力された場合は空のフレームを出力する。
+        * [DLE, N]はNをデータとして扱い、DLEを受信した状態を継続する。
+        * max_frame_lengthを超えたフレームは破棄し、そのフレームの[DLE, ETX]ではフレームを出力しない。
+
+        受信途中のフレームは次回の呼び出しに持ち越す。decode()とは受信途中のフレームを共有しない。
+        '''
+        data = buf if isinstance(buf, bytes) else bytes(buf)
+        self.input_byte_count += len(data)
+        dle = self.dle[0]
+        stx = self.stx[0]
+        etx = self.etx[0]
+        frames: list[bytes] = []
+        frame = self.frame_buffer
+        running = self.state == SerialDecoderState.START or \
+            self.state == SerialDecoderState.RUNNING
+        max_length = self.max_frame_length if self.max_frame_length != None else -1
+        pos = 0
+        end = len(data)
+        # 最後に開始・終了を検知した直後の位置
+        event_pos = -1
+
+        while pos < end:
+            if running and len(frame) > max_length >= 0:
+                # 長すぎるフレームは破棄し、以降は次の[DLE, STX]までDLE毎にまとめて読み飛ばす
+                running = False
+                self.discarding = True
+                self.oversized_frame_count += 1
+                frame.clear()
+            if not self.had_dle:
+                # 次のDLEまでは制御文字を含まないため、まとめてデータとして扱う。
+                i = data.find(self.dle, pos)
+                if i < 0:
+                    i = end
+                if running:
+                    frame += data[pos:i]
+                pos = i
+                if pos >= end:
+                    break
+                self.had_dle = True
+                pos += 1
+                continue
+
+            # 前回の入力でDLEが入力されていた場合、次の1バイトで制御文字を判定する
+            c = data[pos]
+            pos += 1
+            if c == dle:
+                # [DLE, DLE] => データ0x10(DLE)を受信
+                self.had_dle = False
+                if running:
+                    frame.append(dle)
+            elif c == stx:
+                # データ入力の開始を検知、受信途中のフレームは破棄する
+                self.had_dle = False
+                running = True
+                self.discarding = False
+                frame.clear()
+                event_pos = pos
+            elif c == etx:
+                # データ入力の終了を検知
+                self.had_dle = False
+                running = False
+                if self.discarding:
+                    self.discarding = False
+                else:
+                    frames.append(bytes(frame))
+                    self.frame_count += 1
+                frame.clear()
+                event_pos = pos
+            else:
+                # [DLE, otherwise]はプロトコルとしてはエラーだが、実装上はotherwiseをdataとして読み込む
+                self.protocol_error_count += 1
+                if running:
+                    frame.append(c)
+
+        # decode()と同じステートを残す（最後のバイトで開始・終了を検知した場合はSTART/FINISH）
+        if end > 0:
+            if running:
+                self.state = SerialDecoderState.START if event_pos == end else SerialDecoderState.RUNNING
+            else:
+                self.state = SerialDecoderState.FINISH if event_pos == end else SerialDecoderState.STOP
+
+        return frames
+
+    def stats(self) -> dict[str, float]:
+        '''
+        計測値を返す。
+        '''
+        return {
+            "input_bytes": self.input_byte_count,
+            "frames": self.frame_count,
+            "protocol_errors": self.protocol_error_count,
+            "oversized_frames": self.oversized_frame_count,
+            "pending_bytes": len(self.frame_buffer),
+        }
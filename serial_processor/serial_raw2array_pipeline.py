@@ -0,0 +1,100 @@
+import numpy as np
+from numpy.lib import recfunctions
+from serial_processor.serial_byte2data import VariousDataEndian, SerialByte2Data
+from serial_processor.serial_decoder import SerialDecoder
+from serial_processor.pipeline_stats import StageTimer
+
+
+class SerialRaw2ArrayPipeline:
+    '''
+    シリアル通信によって逐次入力されるバイトの生データを、テキストを経由せずに数値の配列に変換する。
+
+    以下の処理を行う。
+
+    * [Serial入力] -(bytes)-> [制御コード処理] -(1サンプル分のbytes)-> [データに変換] -(tuple|ndarray)-> [出力]
+    '''
+
+    def __init__(self, data_format_list: list[str],
+                 dle: bytes = b"\x10", stx: bytes = b"\x02", etx: bytes = b"\x03",
+                 endian: VariousDataEndian = VariousDataEndian.BIGENDIAN, checksum: str | None = None) -> None:
+        '''
+        送られてくるデータの定義、制御コードの定義を行う。
+
+        引数:
+
+        * data_format_list 入力するデータの型を文字列配列で指定する。
+        * dle/stx/etx 制御文字を指定する。
+        * endian ビッグエンディアンかリトルエンディアンかを指定する。
+        * checksum データ列の後ろに付加されたチェックサムの種類を指定する。（Noneの場合はチェックサム無し）
+        '''
+        # バイト列をPythonの内部データに変換する。
+        self.byte2data = SerialByte2Data(data_format_list, endian, checksum=checksum)
+        # シリアル通信に含まれる制御文字を変換する。1サンプル分より長いフレームは受信途中で破棄する。
+        self.protocol_decoder = SerialDecoder(dle=dle, stx=stx, etx=etx, max_frame_length=self.byte2data.frame_size)
+        self.col_count: int = len(data_format_list)
+        # 制御文字の処理、データへの変換の処理時間
+        self.decode_timer = StageTimer()
+        self.convert_timer = StageTimer()
+
+    def decode_frames(self, chunk: bytes | bytearray | memoryview) -> bytes:
+        '''
+        生データから制御文字を取り除き、長さとチェックサムが一致する1サンプル分のバイト列のみを連結して返す。
+        '''
+        t = self.decode_timer.start()
+        frames = self.protocol_decoder.decode_buffer(chunk)
+        joined = self.byte2data.join_frames(frames)
+        self.decode_timer.stop(t)
+        return joined
+
+    @property
+    def dropped_frame_count(self) -> int:
+        '''
+        長すぎる、長さが一致しない、チェックサムが一致しないために破棄したサンプル数
+        '''
+        return self.protocol_decoder.oversized_frame_count + self.byte2data.wrong_length_frame_count + \
+            self.byte2data.checksum_error_count
+
+    def read_chunk(self, chunk: bytes | bytearray | memoryview) -> list[tuple]:
+        '''
+        生データをまとめて入力し、完成したサンプルをタプルの配列として出力する。
+        受信途中のサンプルは次回の呼び出しに持ち越す。
+        '''
+        frames = self.decode_frames(chunk)
+        if len(frames) == 0:
+            return []
+        return self.byte2data.unpack_frames(frames)
+
+    def read_chunk_array(self, chunk: bytes | bytearray | memoryview) -> np.ndarray:
+        '''
+        生データをまとめて入力し、完成したサンプルを形状(サンプル数, 列数)のfloat64配列として出力する。
+        受信途中のサンプルは次回の呼び出しに持ち越す。
+        '''
+        frames = self.decode_frames(chunk)
+        if len(frames) == 0:
+            return np.empty((0, self.col_count), dtype=np.float64)
+        t = self.convert_timer.start()
+        records = self.byte2data.frames2array(frames)
+        values = recfunctions.structured_to_unstructured(records, dtype=np.float64)
+        self.convert_timer.stop(t)
+        return values
+
+    def read_chunk_records(self, chunk: bytes | bytearray | memoryview) -> np.ndarray:
+        '''
+        生データをまとめて入力し、完成したサンプルを元の型のままフィールド"f0", "f1", ...を持つ構造化配列として出力する。
+        受信途中のサンプルは次回の呼び出しに持ち越す。
+        '''
+        return self.byte2data.frames2array(self.decode_frames(chunk))
+
+    def stats(self) -> dict[str, float]:
+        '''
+        制御文字の処理、データへの変換の計測値をまとめて返す。時間の単位は秒。
+        '''
+        result: dict[str, float] = {}
+        for key, value in self.protocol_decoder.stats().items():
+            result["decoder_" + key] = value
+        for key, value in self.byte2data.stats().items():
+            result["byte2data_" + key] = value
+        result["dropped_frames"] = self.dropped_frame_count
+        result.update(self.decode_timer.stats("decode_"))
+        result.update(self.convert_timer.stats("convert_"))
+        return result
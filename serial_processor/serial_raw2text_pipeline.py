@@ -14,7 +14,8 @@ class SerialRaw2TextPipeline:
 
     def __init__(self, data_format_list: list[str],
                  dle: bytes = b"\x10", stx: bytes = b"\x02", etx: bytes = b"\x03",
-                 delimiter: str = ",", endian: VariousDataEndian = VariousDataEndian.BIGENDIAN) -> None:
+                 delimiter: str = ",", endian: VariousDataEndian = VariousDataEndian.BIGENDIAN,
+                 checksum: str | None = None) -> None:
         '''
         送られてくるデータの定義、制御コードの定義を行う。
 
@@ -24,12 +25,13 @@ class SerialRaw2TextPipeline:
         * dle/stx/etx 制御文字を指定する。
         * delimiter テキストで出力される区切り文字を指定する。
         * endian ビッグエンディアンかリトルエンディアンかを指定する。（デフォルトはmicroblazeに倣いビッグエンディアン。 参考: http://www.kumikomi.net/archives/2008/04/07hard1.php ）
+        * checksum データ列の後ろに付加されたチェックサムの種類を指定する。（read_chunk()でのみ検証する）
         '''
         self.delimiter = delimiter
-        # シリアル通信に含まれる制御文字を変換する。
-        self.protocol_decoder = SerialDecoder(dle=dle, stx=stx, etx=etx)
         # バイト列をPythonの内部データに変換する。
-        self.byte2data = SerialByte2Data(data_format_list, endian)
+        self.byte2data = SerialByte2Data(data_format_list, endian, checksum=checksum)
+        # シリアル通信に含まれる制御文字を変換する。
+        self.protocol_decoder = SerialDecoder(dle=dle, stx=stx, etx=etx, max_frame_length=self.byte2data.frame_size)
         self.output_data_count: int = 0
 
     def read_byte(self, input_byte: bytes) -> str | None:
@@ -76,3 +78,19 @@ class SerialRaw2TextPipeline:
             else:
                 self.output_data_count += 1
                 return self.delimiter + " " + str(data)
+
+    def read_chunk(self, chunk: bytes | bytearray | memoryview) -> str:
+        '''
+        シリアル通信から読み取った生データをまとめて入力し、完成したサンプルの整形済みテキストを連結して出力する。
+        サンプルの区切り目には改行が含まれる。受信途中のサンプルは次回の呼び出しに持ち越す。
+        長さ、またはチェックサムが一致しないサンプルは出力しない。
+        '''
+        text_list: list[str] = []
+        separator = self.delimiter + " "
+        for frame in self.protocol_decoder.decode_buffer(chunk):
+            values = self.byte2data.unpack_frame(frame)
+            if values == None:
+                continue
+            text_list.append(separator.join(map(str, values)))
+            text_list.append("\n")
+        return "".join(text_list)
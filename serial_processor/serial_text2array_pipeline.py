@@ -0,0 +1,122 @@
+import numpy as np
+from serial_processor.pipeline_stats import StageTimer
+
+
+class SerialText2ArrayPipeline:
+    '''
+    Arduinoのように区切り文字と改行で送られてくるテキストを、数値の配列に変換する。
+
+    * チャンク毎に改行で区切り、改行が現れていない受信途中の行は次回の呼び出しに持ち越す。
+    * 完成した行はまとめて変換する。列数が合わない行や数値でない値を含む行は破棄し、malformed_line_countに数える。
+    * 空行は無視する。
+    * 改行が現れないまま持ち越す行がmax_line_lengthを超えた場合は、次の改行までを破棄し、malformed_line_countに数える。
+    '''
+
+    def __init__(self, col_count: int, delimiter: str = ",", encoding: str = "ascii",
+                 max_line_length: int = 4096) -> None:
+        '''
+        引数:
+
+        * col_count 1行あたりの列数。
+        * delimiter 区切り文字（1文字）。
+        * encoding 受信するテキストの文字コード（ASCII互換のもの）。
+        * max_line_length 1行の最大バイト数。改行が届かない場合に持ち越す行が際限なく伸びるのを防ぐ。
+        '''
+        self.col_count: int = col_count
+        self.delimiter: bytes = delimiter.encode(encoding)
+        if len(self.delimiter) != 1:
+            raise ValueError("The delimiter must be a single byte.")
+        # 改行が現れていない受信途中の行
+        self.pending: bytes = b""
+        self.max_line_length: int = max_line_length
+        # 長すぎる行を次の改行まで読み捨てている途中か
+        self.discarding: bool = False
+        self.line_count: int = 0
+        self.malformed_line_count: int = 0
+        self.parse_timer = StageTimer()
+
+    def read_chunk_array(self, chunk: bytes | bytearray | memoryview) -> np.ndarray:
+        '''
+        受信したテキストをまとめて入力し、完成した行を形状(行数, 列数)のfloat64配列として出力する。
+        '''
+        data = self.pending + bytes(chunk)
+        if self.discarding:
+            start = data.find(b"\n")
+            if start < 0:
+                return np.empty((0, self.col_count), dtype=np.float64)
+            data = data[start + 1:]
+            self.discarding = False
+        end = data.rfind(b"\n")
+        self.pending = data[end + 1:]
+        if len(self.pending) > self.max_line_length:
+            # 長すぎる行は次の改行まで読み捨てる
+            self.pending = b""
+            self.discarding = True
+            self.malformed_line_count += 1
+        if end < 0:
+            return np.empty((0, self.col_count), dtype=np.float64)
+        t = self.parse_timer.start()
+        values = self.parse_block(data[:end])
+        self.parse_timer.stop(t)
+        return values
+
+    def read_chunk_records(self, chunk: bytes | bytearray | memoryview) -> np.ndarray:
+        '''
+        read_chunk_array()と同じく変換し、フィールド"f0", "f1", ...を持つfloat64の構造化配列として出力する。
+        '''
+        values = np.ascontiguousarray(self.read_chunk_array(chunk))
+        return values.view([("f{}".format(i), np.float64) for i in range(0, self.col_count)]).reshape(-1)
+
+    def parse_block(self, block: bytes) -> np.ndarray:
+        '''
+        改行で区切られた複数行のテキストを変換する。
+        '''
+        block = block.replace(b"\r", b"")
+        codes = np.frombuffer(block, dtype=np.uint8)
+        newline = codes == 0x0a
+        # 行毎の区切り文字の数と文字数を数える
+        line_id = np.cumsum(newline) - newline
+        n_lines = int(line_id[-1]) + 1 if len(codes) > 0 else 1
+        delimiter_count = np.bincount(line_id[codes == self.delimiter[0]], minlength=n_lines)
+        line_length = np.bincount(line_id, minlength=n_lines) - np.bincount(line_id[newline], minlength=n_lines)
+        non_empty = line_length > 0
+        self.line_count += int(np.count_nonzero(non_empty))
+
+        if np.all(delimiter_count[non_empty] == self.col_count - 1):
+            # 全ての行の列数が正しい場合は、まとめて変換する
+            # （区切り文字のみで分割するので、空の値や空白を挟んだ値を含む行はfloat()で失敗して1行ずつの変換に移る）
+            tokens = block.replace(b"\n", self.delimiter).split(self.delimiter)
+            if len(tokens) == np.count_nonzero(non_empty) * self.col_count:
+                try:
+                    return np.array(tokens, dtype=np.float64).reshape(-1, self.col_count)
+                except ValueError:
+                    pass
+
+        # 不正な行を含む場合は1行ずつ変換する
+        rows: list[list[float]] = []
+        for line in block.split(b"\n"):
+            if len(line) == 0:
+                continue
+            values = line.split(self.delimiter)
+            if len(values) != self.col_count:
+                self.malformed_line_count += 1
+                continue
+            try:
+                rows.append([float(v) for v in values])
+            except ValueError:
+                self.malformed_line_count += 1
+        if len(rows) == 0:
+            return np.empty((0, self.col_count), dtype=np.float64)
+        return np.array(rows, dtype=np.float64)
+
+    def stats(self) -> dict[str, float]:
+        '''
+        計測値を返す。時間の単位は秒。
+        '''
+        result: dict[str, float] = {
+            "lines": self.line_count,
+            "malformed_lines": self.malformed_line_count,
+            "pending_bytes": len(self.pending),
+        }
+        result.update(self.parse_timer.stats("parse_"))
+        return result
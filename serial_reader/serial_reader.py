@@ -6,12 +6,53 @@ class SerialReader:
     Serial通信を行いデータを取得する
     '''
 
-    def __init__(self, port: str, baudrate: int, timeout: float | None) -> None:
+    def __init__(self, port: str, baudrate: int, timeout: float | None, chunk_size: int = 4096) -> None:
+        '''
+        引数:
+
+        * port/baudrate シリアルポートとボーレートを指定する。
+        * chunk_size read_chunk()で一度に読み込む最大バイト数を指定する。
+        '''
         self.serial = serial.Serial(
             port=port, baudrate=baudrate, timeout=None)
+        # read_chunk()で使い回す受信バッファ
+        self.chunk_buffer: bytearray = bytearray(chunk_size)
+        self.chunk_view: memoryview = memoryview(self.chunk_buffer)
+        # 計測値
+        self.read_count: int = 0
+        self.received_byte_count: int = 0
 
     def read_byte(self) -> bytes:
         return self.serial.read()
 
+    def readinto(self, buffer: bytearray | memoryview) -> int:
+        '''
+        受信済みのバイトをまとめてbufferに読み込み、読み込んだバイト数を返す。
+        受信済みのバイトが無い場合は、1バイト届くまでブロックする。
+        '''
+        size = min(max(self.serial.in_waiting, 1), len(buffer))
+        n = self.serial.readinto(memoryview(buffer)[:size])
+        self.read_count += 1
+        self.received_byte_count += n
+        return n
+
+    def read_chunk(self) -> memoryview:
+        '''
+        受信済みのバイトをまとめて読み込む。
+        戻り値は内部バッファのビューであり、次にread_chunk()を呼ぶまでの間だけ有効である。
+        '''
+        n = self.readinto(self.chunk_view)
+        return self.chunk_view[:n]
+
+    def stats(self) -> dict[str, float]:
+        '''
+        計測値を返す。
+        '''
+        return {
+            "reads": self.read_count,
+            "received_bytes": self.received_byte_count,
+            "in_waiting": self.serial.in_waiting,
+        }
+
     def close(self):
         self.serial.close()
@@ -0,0 +1,168 @@
+import json
+import os
+import numpy as np
+from serial_processor.serial_byte2data import VariousDataEndian, SerialByte2Data
+
+# 列毎のファイルとともに置くメタデータ
+COLUMN_META_FILE: str = "meta.json"
+
+
+class ColumnWriter:
+    '''
+    デコード済みのサンプルを、列毎のバイナリファイルにチャンク単位で追記する。
+
+    ディレクトリの構成:
+
+    * meta.json 列名、列の型、チャンク毎の行数、総行数
+    * {列名}.bin 列の値をリトルエンディアンの元の型のまま連結したもの
+
+    メタデータはチャンクを書き込む度に更新する。
+    '''
+
+    def __init__(self, directory: str, data_format_list: list[str],
+                 column_names: list[str] | None = None, chunk_rows: int = 65536) -> None:
+        '''
+        引数:
+
+        * directory 書き込み先のディレクトリ。無い場合は作成し、既存の列ファイルは上書きする。
+        * data_format_list 入力するデータの型を文字列配列で指定する。列の型を決めるのに用いる。
+        * column_names 列名。省略した場合は"f0", "f1", ...とする。
+        * chunk_rows 1チャンクの行数。この行数が溜まる毎にまとめて書き込む。
+        '''
+        os.makedirs(directory, exist_ok=True)
+        self.directory: str = directory
+        self.chunk_rows: int = chunk_rows
+        dtype_list = SerialByte2Data(data_format_list, VariousDataEndian.LITTLEENDIAN).column_dtype_list()
+        if column_names == None:
+            column_names = ["f{}".format(i) for i in range(0, len(dtype_list))]
+        if len(column_names) != len(dtype_list):
+            raise ValueError("The number of column names does not match data_format_list.")
+        self.column_names: list[str] = column_names
+        self.dtype_list: list[np.dtype] = [dt.newbyteorder("<") for dt in dtype_list]
+        self.data_format_list: list[str] = data_format_list
+        self.files = [open(os.path.join(directory, name + ".bin"), "wb") for name in column_names]
+        # 書き込み待ちのバッチ
+        self.pending: list[np.ndarray] = []
+        self.pending_rows: int = 0
+        self.chunk_list: list[int] = []
+        self.row_count: int = 0
+        self.write_meta()
+
+    def write(self, rows: np.ndarray) -> None:
+        '''
+        形状(行数, 列数)の配列、または列名をフィールドに持つ構造化配列を追記する。
+        '''
+        if len(rows) == 0:
+            return
+        self.pending.append(rows)
+        self.pending_rows += len(rows)
+        if self.pending_rows >= self.chunk_rows:
+            self.flush()
+
+    def write_columns(self, columns: dict[str, np.ndarray]) -> None:
+        '''
+        列名と列の値の辞書を追記する。値は列の型に変換して保持する。
+        '''
+        length = len(columns[self.column_names[0]])
+        if length == 0:
+            return
+        rows = np.empty(length, dtype=[(name, dt) for name, dt in zip(self.column_names, self.dtype_list)])
+        for name in self.column_names:
+            rows[name] = columns[name]
+        self.write(rows)
+
+    def flush(self) -> None:
+        '''
+        書き込み待ちのサンプルを1チャンクとして書き込む。
+        '''
+        if self.pending_rows == 0:
+            return
+        rows = np.concatenate(self.pending)
+        for i, (name, f) in enumerate(zip(self.column_names, self.files)):
+            column = rows[name] if rows.dtype.names != None else rows[:, i]
+            np.ascontiguousarray(column, dtype=self.dtype_list[i]).tofile(f)
+            f.flush()
+        self.chunk_list.append(len(rows))
+        self.row_count += len(rows)
+        self.pending.clear()
+        self.pending_rows = 0
+        self.write_meta()
+
+    def write_meta(self) -> None:
+        meta = {
+            "data_format": self.data_format_list,
+            "columns": [{"name": name, "dtype": dt.str} for name, dt in zip(self.column_names, self.dtype_list)],
+            "chunks": self.chunk_list,
+            "row_count": self.row_count,
+        }
+        path = os.path.join(self.directory, COLUMN_META_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(path + ".tmp", path)
+
+    def close(self) -> None:
+        self.flush()
+        for f in self.files:
+            f.close()
+
+    def __enter__(self) -> "ColumnWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class ColumnReader:
+    '''
+    ColumnWriterで書き込んだディレクトリを読み込む。
+    列毎のファイルをメモリマップし、指定された列・範囲のみを読み込む。
+    '''
+
+    def __init__(self, directory: str) -> None:
+        with open(os.path.join(directory, COLUMN_META_FILE)) as f:
+            self.meta: dict = json.load(f)
+        self.directory: str = directory
+        self.column_names: list[str] = [c["name"] for c in self.meta["columns"]]
+        self.dtype_list: list[np.dtype] = [np.dtype(c["dtype"]) for c in self.meta["columns"]]
+        self.row_count: int = self.meta["row_count"]
+        self.maps: dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self.row_count
+
+    def column_index(self, column: str | int) -> int:
+        return column if isinstance(column, int) else self.column_names.index(column)
+
+    def memmap(self, column: str | int) -> np.ndarray:
+        '''
+        列全体をメモリマップした配列を返す。アクセスした範囲のみがディスクから読み込まれる。
+        '''
+        i = self.column_index(column)
+        name = self.column_names[i]
+        if name not in self.maps:
+            if self.row_count == 0:
+                self.maps[name] = np.empty(0, dtype=self.dtype_list[i])
+            else:
+                self.maps[name] = np.memmap(os.path.join(self.directory, name + ".bin"),
+                                            dtype=self.dtype_list[i], mode="r", shape=(self.row_count,))
+        return self.maps[name]
+
+    def read(self, column: str | int, start: int = 0, stop: int | None = None) -> np.ndarray:
+        '''
+        列の[start, stop)行を読み込んで返す。
+        '''
+        return np.array(self.memmap(column)[start:stop])
+
+    def range_of(self, x_column: str | int, x_start: float, x_end: float) -> tuple[int, int]:
+        '''
+        単調増加する列x_columnの値が[x_start, x_end]に含まれる行の範囲[start, stop)を二分探索で返す。
+        '''
+        x = self.memmap(x_column)
+        return int(np.searchsorted(x, x_start, side="left")), int(np.searchsorted(x, x_end, side="right"))
+
+    def read_range(self, columns: list[str | int], x_column: str | int, x_start: float, x_end: float) -> dict[str, np.ndarray]:
+        '''
+        x_columnの値が[x_start, x_end]に含まれる行について、指定された列を読み込んで返す。
+        '''
+        start, stop = self.range_of(x_column, x_start, x_end)
+        return {self.column_names[self.column_index(c)]: self.read(c, start, stop) for c in columns}
@@ -0,0 +1,160 @@
+import json
+import mmap
+import struct
+import time
+import numpy as np
+from serial_processor.serial_byte2data import VariousDataEndian, endian_byteorder
+from serial_processor.serial_raw2array_pipeline import SerialRaw2ArrayPipeline
+from serial_processor.serial_text2array_pipeline import SerialText2ArrayPipeline
+
+# 生データ記録ファイルの先頭に置く識別子
+RAW_FILE_MAGIC: bytes = b"SPPRAW\x00\x01"
+# 識別子の後に置くヘッダ（JSON）の長さ
+RAW_HEADER_LENGTH = struct.Struct("<I")
+
+
+class RawRecorder:
+    '''
+    シリアル通信で受信した生データを、受信した順にそのままファイルへ追記する。
+
+    ファイルの構成:
+
+    * 識別子 RAW_FILE_MAGIC
+    * ヘッダの長さ（uint32 リトルエンディアン）
+    * ヘッダ（JSON）: 受信モード、データフォーマット、エンディアン、制御文字、区切り文字、チェックサム
+    * 生データ
+    '''
+
+    def __init__(self, path: str, data_format_list: list[str],
+                 dle: bytes = b"\x10", stx: bytes = b"\x02", etx: bytes = b"\x03",
+                 endian: VariousDataEndian = VariousDataEndian.BIGENDIAN, buffer_size: int = 1 << 20,
+                 mode: str = "bin", delimiter: str = ",", checksum: str | None = None) -> None:
+        '''
+        引数:
+
+        * path 記録先のファイル。既に存在する場合は上書きする。
+        * data_format_list/dle/stx/etx/endian 再生時にデコードする為の設定。
+        * buffer_size 書き込みバッファの大きさ。バッファが一杯になった時にまとめて書き込む。
+        * mode/delimiter 受信モード（"bin"以外はテキスト）とテキストの区切り文字。
+        * checksum フレームに付加されたチェックサムの種類。
+        '''
+        self.file = open(path, "wb", buffering=buffer_size)
+        header = json.dumps({
+            "mode": mode,
+            "delimiter": delimiter,
+            "data_format": data_format_list,
+            "endian": endian_byteorder(endian),
+            "dle": dle[0],
+            "stx": stx[0],
+            "etx": etx[0],
+            "checksum": checksum,
+            "created": time.time(),
+        }).encode("utf-8")
+        self.file.write(RAW_FILE_MAGIC)
+        self.file.write(RAW_HEADER_LENGTH.pack(len(header)))
+        self.file.write(header)
+        self.recorded_byte_count: int = 0
+
+    def write(self, chunk: bytes | bytearray | memoryview) -> None:
+        '''
+        受信した生データを追記する。
+        '''
+        self.file.write(chunk)
+        self.recorded_byte_count += len(chunk)
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self) -> "RawRecorder":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class RawReplaySource:
+    '''
+    RawRecorderで記録したファイルをメモリマップし、生データをSerialReaderと同様にread_chunk()で返す。
+    全て返し終わった後は空のチャンクを返す。
+    '''
+
+    def __init__(self, path: str, chunk_size: int = 1 << 16) -> None:
+        '''
+        引数:
+
+        * path 再生するファイル。
+        * chunk_size read_chunk()で一度に返す最大バイト数。
+        '''
+        self.file = open(path, "rb")
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mmap[:len(RAW_FILE_MAGIC)] != RAW_FILE_MAGIC:
+            self.close()
+            raise ValueError("Not a raw capture file. path:{}".format(path))
+        offset = len(RAW_FILE_MAGIC)
+        header_length = RAW_HEADER_LENGTH.unpack_from(self.mmap, offset)[0]
+        offset += RAW_HEADER_LENGTH.size
+        self.header: dict = json.loads(self.mmap[offset:offset + header_length].decode("utf-8"))
+        offset += header_length
+
+        self.data_format: list[str] = self.header["data_format"]
+        self.endian: VariousDataEndian = VariousDataEndian.BIGENDIAN \
+            if self.header["endian"] == "big" else VariousDataEndian.LITTLEENDIAN
+        self.dle: bytes = bytes((self.header["dle"],))
+        self.stx: bytes = bytes((self.header["stx"],))
+        self.etx: bytes = bytes((self.header["etx"],))
+        self.mode: str = self.header.get("mode", "bin")
+        self.delimiter: str = self.header.get("delimiter", ",")
+        self.checksum: str | None = self.header.get("checksum")
+
+        self.chunk_size: int = chunk_size
+        self.data: memoryview = memoryview(self.mmap)[offset:]
+        self.pos: int = 0
+
+    def make_pipeline(self) -> SerialRaw2ArrayPipeline | SerialText2ArrayPipeline:
+        '''
+        ヘッダの設定でデコードするパイプラインを作成する。
+        '''
+        if self.mode != "bin":
+            return SerialText2ArrayPipeline(len(self.data_format), delimiter=self.delimiter)
+        return SerialRaw2ArrayPipeline(self.data_format, dle=self.dle, stx=self.stx, etx=self.etx, endian=self.endian,
+                                       checksum=self.checksum)
+
+    def read_chunk(self) -> memoryview:
+        '''
+        次の生データをコピー無しで返す。
+        '''
+        chunk = self.data[self.pos:self.pos + self.chunk_size]
+        self.pos += len(chunk)
+        return chunk
+
+    def rewind(self) -> None:
+        self.pos = 0
+
+    def close(self) -> None:
+        if hasattr(self, "data"):
+            self.data.release()
+        try:
+            self.mmap.close()
+        except BufferError:
+            # read_chunk()で返したチャンクが残っている場合、マップの解放はガベージコレクションに任せる
+            pass
+        self.file.close()
+
+
+def replay_file(path: str, chunk_size: int = 1 << 20) -> np.ndarray:
+    '''
+    記録したファイルを全てデコードし、形状(サンプル数, 列数)のfloat64配列を返す。
+    '''
+    source = RawReplaySource(path, chunk_size=chunk_size)
+    try:
+        pipeline = source.make_pipeline()
+        batches: list[np.ndarray] = []
+        while True:
+            chunk = source.read_chunk()
+            if len(chunk) == 0:
+                break
+            batches.append(pipeline.read_chunk_array(chunk))
+        chunk.release()
+    finally:
+        source.close()
+    return np.concatenate(batches) if len(batches) > 0 else np.empty((0, len(source.data_format)))
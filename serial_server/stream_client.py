@@ -0,0 +1,145 @@
+import json
+import queue
+import socket
+import threading
+import numpy as np
+from serial_server.stream_protocol import BLOCK_DTYPE, BLOCK_HEADER, STREAM_HEADER_LENGTH, STREAM_MAGIC, parse_address
+
+
+class SampleStreamClient:
+    '''
+    SampleStreamServerに接続し、配信されたサンプルをバックグラウンドスレッドで受信してキューに溜める。
+    SerialAcquisitionと同じくdrain()で溜まったサンプルを取り出せるため、描画側はシリアルポートの代わりに用いることができる。
+
+    サーバー側で破棄されたサンプル数は、ブロックの通し番号の飛びから数える。
+    '''
+
+    def __init__(self, address: str, keep_time: bool = True, max_queue_batches: int = 1024,
+                 timeout: float | None = 5.0) -> None:
+        '''
+        接続し、サーバーのヘッダ（列名、データフォーマット）を受信する。
+
+        引数:
+
+        * address 接続先（"unix:/tmp/serial.sock"、"127.0.0.1:5555"など）。
+        * keep_time Falseの場合、先頭の受信時刻の列を取り除いてdrain()で返す。
+        * max_queue_batches キューに溜めるブロックの最大数。一杯の場合は新たに受信したブロックを破棄する。
+        * timeout 接続とヘッダの受信を待つ時間[s]。
+        '''
+        kind, path_or_host, port = parse_address(address)
+        if kind == "unix":
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.settimeout(timeout)
+            self.socket.connect(path_or_host)
+        else:
+            self.socket = socket.create_connection((path_or_host, port), timeout=timeout)
+        self.stream = self.socket.makefile("rb")
+        if self.read_exact(len(STREAM_MAGIC)) != STREAM_MAGIC:
+            self.close()
+            raise ValueError("Not a sample stream server. address:{}".format(address))
+        header_length = STREAM_HEADER_LENGTH.unpack(self.read_exact(STREAM_HEADER_LENGTH.size))[0]
+        self.header: dict = json.loads(self.read_exact(header_length).decode("utf-8"))
+        # 接続後の受信はブロックして待つ
+        self.socket.settimeout(None)
+
+        self.column_names: list[str] = self.header["columns"]
+        self.data_format: list[str] = self.header["data_format"]
+        # 先頭の列が受信時刻の場合、keep_timeに従って取り除く
+        self.drop_time: bool = not keep_time and len(self.column_names) > 0 and self.column_names[0] == "time"
+        self.sample_queue: queue.Queue[np.ndarray] = queue.Queue(maxsize=max_queue_batches)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.error: BaseException | None = None
+        # サーバーが配信を終了したか
+        self.finished: bool = False
+
+        # カウンタ
+        self.received_byte_count: int = 0
+        self.received_sample_count: int = 0
+        # サーバー側で破棄されたサンプル数、キューが一杯で破棄したサンプル数
+        self.server_dropped_sample_count: int = 0
+        self.dropped_sample_count: int = 0
+        self.next_sequence: int | None = None
+
+    def read_exact(self, size: int) -> bytes:
+        '''
+        sizeバイトを受信する。サーバーが切断した場合は空のバイト列を返す。
+        '''
+        data = self.stream.read(size)
+        if data == None or len(data) < size:
+            return b""
+        return data
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self, timeout: float | None = 1.0) -> None:
+        '''
+        接続を閉じて受信スレッドを停止する。
+        '''
+        self.close()
+        self.thread.join(timeout)
+
+    def close(self) -> None:
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
+
+    def run(self) -> None:
+        '''
+        受信スレッドの本体。ブロックを受信して配列に変換し、キューに溜める。
+        '''
+        try:
+            while True:
+                head = self.read_exact(BLOCK_HEADER.size)
+                if len(head) == 0:
+                    break
+                row_count, col_count, sequence = BLOCK_HEADER.unpack(head)
+                body = self.read_exact(row_count * col_count * BLOCK_DTYPE.itemsize)
+                if len(body) == 0 and row_count * col_count > 0:
+                    break
+                self.received_byte_count += len(head) + len(body)
+                if self.next_sequence != None and sequence > self.next_sequence:
+                    self.server_dropped_sample_count += sequence - self.next_sequence
+                self.next_sequence = sequence + row_count
+                self.received_sample_count += row_count
+                rows = np.frombuffer(body, dtype=BLOCK_DTYPE).reshape(row_count, col_count)
+                if self.drop_time:
+                    rows = rows[:, 1:]
+                try:
+                    self.sample_queue.put_nowait(rows)
+                except queue.Full:
+                    self.dropped_sample_count += row_count
+        except OSError:
+            # stop()で接続を閉じた場合
+            pass
+        except BaseException as e:
+            self.error = e
+        self.finished = True
+
+    def drain(self, max_batches: int | None = None) -> list[np.ndarray]:
+        '''
+        キューに溜まったブロックを取り出す。溜まっていない場合は空の配列を返す。
+        '''
+        if self.error != None:
+            raise RuntimeError("Stream client thread stopped.") from self.error
+        batches: list[np.ndarray] = []
+        while max_batches == None or len(batches) < max_batches:
+            try:
+                batches.append(self.sample_queue.get_nowait())
+            except queue.Empty:
+                break
+        return batches
+
+    def stats(self) -> dict[str, float]:
+        '''
+        カウンタの現在値を返す。
+        '''
+        return {
+            "received_bytes": self.received_byte_count,
+            "received_samples": self.received_sample_count,
+            "server_dropped_samples": self.server_dropped_sample_count,
+            "dropped_samples": self.dropped_sample_count,
+            "queue_depth": self.sample_queue.qsize(),
+        }
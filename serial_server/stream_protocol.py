@@ -0,0 +1,45 @@
+import json
+import struct
+import numpy as np
+
+# 接続直後にサーバーが送る識別子
+STREAM_MAGIC: bytes = b"SPPSTRM\x01"
+# 識別子の後に置くヘッダ（JSON）の長さ
+STREAM_HEADER_LENGTH = struct.Struct("<I")
+# サンプルのブロックの先頭に置く（行数, 列数, 先頭のサンプルの通し番号）
+BLOCK_HEADER = struct.Struct("<IIQ")
+# ブロックの値の型
+BLOCK_DTYPE = np.dtype("<f8")
+
+
+def parse_address(address: str) -> tuple[str, str, int]:
+    '''
+    接続先を解釈し、（"unix"|"tcp", パスまたはホスト, ポート番号）を返す。
+
+    * "unix:/tmp/serial.sock" Unixドメインソケット
+    * "127.0.0.1:5555" TCP（ホストを省略した":5555"は127.0.0.1とする）
+    '''
+    if address.startswith("unix:"):
+        return ("unix", address[len("unix:"):], 0)
+    host, _, port = address.rpartition(":")
+    if port == "":
+        raise ValueError("Incorrect address. address:{}".format(address))
+    return ("tcp", host if host != "" else "127.0.0.1", int(port))
+
+
+def pack_header(header: dict) -> bytes:
+    '''
+    接続直後に送る識別子とヘッダを作成する。
+    ヘッダは列名"columns"、データフォーマット"data_format"などを持つJSON。
+    '''
+    body = json.dumps(header).encode("utf-8")
+    return STREAM_MAGIC + STREAM_HEADER_LENGTH.pack(len(body)) + body
+
+
+def pack_block(sequence: int, rows: np.ndarray) -> bytes:
+    '''
+    形状(サンプル数, 列数)の配列を、ブロックヘッダとリトルエンディアンのfloat64の値に変換する。
+    sequenceは先頭のサンプルの通し番号で、受信側はこれが飛んだことで破棄されたサンプル数を知る。
+    '''
+    values = np.ascontiguousarray(rows, dtype=BLOCK_DTYPE)
+    return BLOCK_HEADER.pack(values.shape[0], values.shape[1], sequence) + values.tobytes()
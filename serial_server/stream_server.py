@@ -0,0 +1,204 @@
+import asyncio
+import os
+from typing import Callable, Protocol
+import numpy as np
+from serial_server.stream_protocol import pack_block, pack_header, parse_address
+
+
+class SampleSource(Protocol):
+    '''
+    drain()でデコード済みのサンプルのバッチを返す入力元（SerialAcquisitionなど）
+    '''
+
+    finished: bool
+
+    def drain(self, max_batches: int | None = None) -> list[np.ndarray]:
+        ...
+
+
+class StreamClient:
+    '''
+    サーバーに接続しているクライアント毎の送信キューと計測値
+    '''
+
+    def __init__(self, writer: asyncio.StreamWriter, max_blocks: int) -> None:
+        self.writer = writer
+        # 送信待ちのブロック（Noneは送信の終了を表す）
+        self.block_queue: asyncio.Queue[bytes | None] = asyncio.Queue(maxsize=max_blocks)
+        self.sent_block_count: int = 0
+        self.dropped_block_count: int = 0
+        self.closed: bool = False
+
+
+class SampleStreamServer:
+    '''
+    デコード済みのサンプルを、ローカルのソケット（TCPまたはUnixドメインソケット）に接続した複数のクライアントへ配信する。
+
+    入力元から取り出したサンプルは、poll_interval毎に1つのブロックにまとめて1度だけバイト列に変換し、
+    全てのクライアントの送信キューに入れる。送信はクライアント毎のタスクで行い、
+    ソケットの送信バッファが一杯になったクライアントはそのクライアントのタスクだけが待つ（バックプレッシャー）。
+    送信キューも一杯になった場合、slow_clientが"drop"なら最も古いブロックを破棄し、
+    "disconnect"なら接続を切る。いずれの場合も他のクライアントへの配信は止まらない。
+
+    通信の形式はstream_protocolを参照。
+    '''
+
+    def __init__(self, source: SampleSource, address: str, column_names: list[str], data_format_list: list[str],
+                 max_client_blocks: int = 64, slow_client: str = "drop", poll_interval: float = 0.01,
+                 write_buffer_size: int = 1 << 20) -> None:
+        '''
+        引数:
+
+        * source デコード済みのサンプルを返す入力元。
+        * address 待ち受けるアドレス（"unix:/tmp/serial.sock"、"127.0.0.1:5555"など）。
+        * column_names/data_format_list 接続時にクライアントへ送る列名とデータフォーマット。
+        * max_client_blocks クライアント毎に溜める送信待ちのブロックの最大数。
+        * slow_client 送信待ちのブロックが溢れたクライアントの扱い "drop"（古いブロックを破棄）/"disconnect"（切断）
+        * poll_interval 入力元からサンプルを取り出す間隔[s]。
+        * write_buffer_size クライアント毎のソケットの送信バッファの上限。超えた場合はそのクライアントの送信を待つ。
+        '''
+        if slow_client not in ("drop", "disconnect"):
+            raise ValueError("Incorrect slow_client. slow_client:{}".format(slow_client))
+        self.source = source
+        self.address: str = address
+        self.max_client_blocks: int = max_client_blocks
+        self.slow_client: str = slow_client
+        self.poll_interval: float = poll_interval
+        self.write_buffer_size: int = write_buffer_size
+        self.header: bytes = pack_header({"columns": column_names, "data_format": data_format_list})
+        self.clients: list[StreamClient] = []
+        self.stop_requested: bool = False
+        # 配信したサンプルの通し番号
+        self.sequence: int = 0
+        # 計測値
+        self.published_block_count: int = 0
+        self.dropped_block_count: int = 0
+        self.disconnected_client_count: int = 0
+
+    async def serve(self, report: Callable[[], None] | None = None, report_interval: float = 1.0) -> None:
+        '''
+        待ち受けを開始し、stop()が呼ばれるか入力元の終端に達するまで配信する。
+        reportを指定した場合はreport_interval秒毎に呼び出す。
+        '''
+        kind, path_or_host, port = parse_address(self.address)
+        if kind == "unix":
+            if os.path.exists(path_or_host):
+                os.remove(path_or_host)
+            server = await asyncio.start_unix_server(self.handle_client, path=path_or_host)
+        else:
+            server = await asyncio.start_server(self.handle_client, host=path_or_host, port=port)
+        loop = asyncio.get_running_loop()
+        report_time = loop.time()
+        try:
+            while not self.stop_requested:
+                # 終端に達したかは取り出す前に確かめる（取り出した後に最後のバッチが溜まる場合がある）
+                finished = self.source.finished
+                batches = self.source.drain()
+                if len(batches) > 0:
+                    self.publish(np.concatenate(batches) if len(batches) > 1 else batches[0])
+                if finished:
+                    break
+                if report != None and loop.time() - report_time >= report_interval:
+                    report_time = loop.time()
+                    report()
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            server.close()
+            # 送信待ちのブロックを送り終えてから切断する
+            for client in self.clients:
+                self.offer(client, None)
+            try:
+                await asyncio.wait_for(server.wait_closed(), timeout=1.0)
+            except asyncio.TimeoutError:
+                pass
+            deadline = loop.time() + 1.0
+            while len(self.clients) > 0 and loop.time() < deadline:
+                await asyncio.sleep(self.poll_interval)
+            # 送信が進まないクライアントは、送信待ちのデータを破棄して切断する
+            for client in list(self.clients):
+                client.writer.transport.abort()
+            await asyncio.sleep(0)
+            if kind == "unix" and os.path.exists(path_or_host):
+                os.remove(path_or_host)
+
+    def stop(self) -> None:
+        self.stop_requested = True
+
+    def publish(self, rows: np.ndarray) -> None:
+        '''
+        サンプルを1つのブロックに変換し、全てのクライアントの送信キューに入れる。
+        '''
+        block = pack_block(self.sequence, rows)
+        self.sequence += len(rows)
+        self.published_block_count += 1
+        for client in list(self.clients):
+            self.offer(client, block)
+
+    def offer(self, client: StreamClient, block: bytes | None) -> None:
+        '''
+        クライアントの送信キューにブロックを入れる。一杯の場合はslow_clientに従って破棄または切断する。
+        '''
+        if client.closed:
+            return
+        try:
+            client.block_queue.put_nowait(block)
+            return
+        except asyncio.QueueFull:
+            pass
+        if self.slow_client == "disconnect":
+            self.close_client(client)
+            return
+        # 最も古いブロックを破棄する（受信側は通し番号の飛びで破棄を検知する）
+        client.block_queue.get_nowait()
+        client.dropped_block_count += 1
+        self.dropped_block_count += 1
+        client.block_queue.put_nowait(block)
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        '''
+        クライアント毎の送信タスク。送信キューのブロックを順に送る。
+        '''
+        writer.transport.set_write_buffer_limits(high=self.write_buffer_size)
+        client = StreamClient(writer, self.max_client_blocks)
+        self.clients.append(client)
+        try:
+            writer.write(self.header)
+            while not client.closed:
+                block = await client.block_queue.get()
+                if block == None:
+                    break
+                writer.write(block)
+                # 送信バッファが上限を超えている場合は、このクライアントの送信だけが待つ
+                await writer.drain()
+                client.sent_block_count += 1
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.remove(client)
+            client.closed = True
+            writer.close()
+
+    def close_client(self, client: StreamClient) -> None:
+        '''
+        送信が追いつかないクライアントを切断する。
+        '''
+        client.closed = True
+        client.writer.close()
+        self.disconnected_client_count += 1
+        # 送信タスクを待ち状態から抜けさせる
+        while not client.block_queue.empty():
+            client.block_queue.get_nowait()
+        client.block_queue.put_nowait(None)
+
+    def stats(self) -> dict[str, float]:
+        '''
+        計測値を返す。
+        '''
+        return {
+            "clients": len(self.clients),
+            "published_blocks": self.published_block_count,
+            "published_samples": self.sequence,
+            "dropped_blocks": self.dropped_block_count,
+            "disconnected_clients": self.disconnected_client_count,
+            "max_client_queue_depth": max((c.block_queue.qsize() for c in self.clients), default=0),
+        }
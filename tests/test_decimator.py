@@ -0,0 +1,44 @@
+import numpy as np
+from serial_plotter.decimator import EnvelopeDecimator, lttb
+from serial_plotter.ring_buffer import RingBuffer
+
+
+def test_cached_envelope_matches_fresh_decimator() -> None:
+    '''
+    RingBufferに乱数の大きさのバッチで追加しながら間引き、キャッシュを使った結果が
+    新たに作成したEnvelopeDecimatorの結果と一致し、ビュー全体の最小値・最大値を残すことを確かめる。
+    '''
+    capacity = 5000
+    rng = np.random.default_rng(0)
+    buffer = RingBuffer(capacity, 3)
+    decimator = EnvelopeDecimator(capacity, 2, 300)
+    total = 0
+    for i in range(0, 200):
+        n = int(rng.choice([1, 7, 100, 1000, 6000]))
+        buffer.extend(np.column_stack([np.arange(total, total + n), rng.normal(size=(n, 2))]))
+        total += n
+        view = buffer.view()
+        result = decimator.decimate(view[0], view[1:], buffer.total_count)
+        expected = EnvelopeDecimator(capacity, 2, 300).decimate(view[0], view[1:], buffer.total_count)
+        for (x, y), (expected_x, expected_y), line in zip(result, expected, view[1:]):
+            np.testing.assert_array_equal(x, expected_x)
+            np.testing.assert_array_equal(y, expected_y)
+            assert np.all(np.diff(x) > 0)
+            assert y.min() == line.min() and y.max() == line.max()
+            assert len(x) <= 2 * 300 + 2 * decimator.bucket_size
+
+
+def test_lttb_point_count() -> None:
+    '''
+    LTTBで指定した点数に間引き、横軸の順序と先頭・末尾の点を保つことを確かめる。
+    '''
+    rng = np.random.default_rng(0)
+    x = np.cumsum(rng.random(10000))
+    y = rng.normal(size=10000)
+    for out_count in [3, 10, 500, 9999]:
+        out_x, out_y = lttb(x, y, out_count)
+        assert len(out_x) == len(out_y) == out_count
+        assert np.all(np.diff(out_x) > 0)
+        assert out_x[0] == x[0] and out_x[-1] == x[-1]
+    out_x, out_y = lttb(x, y, 20000)
+    assert len(out_x) == len(x)
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+from serial_analysis.derived_channels import DerivedChannels
+
+
+def naive_rolling(values: np.ndarray, window: int, function) -> np.ndarray:
+    '''
+    各サンプルについて、直近windowサンプル（入力開始直後はそれまでの全て）から統計量を計算する。
+    '''
+    return np.array([function(values[max(0, i - window + 1):i + 1]) for i in range(0, len(values))])
+
+
+@pytest.mark.parametrize("window", [1, 2, 5, 32])
+def test_rolling_statistics_match_naive_window(window: int) -> None:
+    '''
+    乱数のデータを1サンプルを含む乱数の大きさのバッチに分けて入力し、
+    移動統計量と差分がバッチに分けずに窓毎に計算した値と一致することを確かめる。
+    '''
+    rng = np.random.default_rng(window)
+    values = rng.normal(0, 10, size=(2000, 1))
+    derived = DerivedChannels([
+        "a = mavg(f0, {})".format(window),
+        "r = rms(f0, {})".format(window),
+        "hi = rmax(f0, {})".format(window),
+        "lo = rmin(f0, {})".format(window),
+        "d = diff(f0)",
+    ], ["f0"])
+    sizes = rng.choice([1, 1, 2, 3, window, window + 1, 50], size=len(values))
+    bounds = np.cumsum(sizes)
+    bounds = bounds[bounds < len(values)]
+    result = np.concatenate([derived.apply(batch) for batch in np.split(values, bounds)])
+
+    x = values[:, 0]
+    np.testing.assert_allclose(result[:, 0], naive_rolling(x, window, np.mean), atol=1e-9)
+    np.testing.assert_allclose(result[:, 1], naive_rolling(x, window, lambda v: np.sqrt(np.mean(v * v))), atol=1e-9)
+    np.testing.assert_array_equal(result[:, 2], naive_rolling(x, window, np.max))
+    np.testing.assert_array_equal(result[:, 3], naive_rolling(x, window, np.min))
+    np.testing.assert_array_equal(result[:, 4], np.diff(x, prepend=x[0]))
+
+
+@pytest.mark.parametrize("definitions", [["f0 = f1 * 2"], ["time = f0"], ["sqrt = f0"], ["a = f0", "a = f1"]])
+def test_colliding_names_are_rejected(definitions: list[str]) -> None:
+    '''
+    データ列、受信時刻、関数、前の派生データ列と同じ名前の派生データ列を拒否することを確かめる。
+    '''
+    with pytest.raises(ValueError):
+        DerivedChannels(definitions, ["f0", "f1"])
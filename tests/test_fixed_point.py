@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+from serial_processor.serial_byte2data import SerialByte2Data, VariousDataEndian, endian_byteorder
+
+
+@pytest.mark.parametrize("fp_format", ["fp1q0", "ufp1q1", "fp8q7", "ufp12q4", "fp16q15", "fp24q23", "ufp24q0",
+                                       "fp40q20", "ufp48q16", "fp56q8", "fp64q32", "ufp64q0", "fp64q63"])
+@pytest.mark.parametrize("endian", [VariousDataEndian.BIGENDIAN, VariousDataEndian.LITTLEENDIAN])
+def test_fixed_point_implementations_agree(fp_format: str, endian: VariousDataEndian) -> None:
+    '''
+    乱数のバイト列を、1バイトずつの変換、unpack_frame()、frames2array()で変換し、
+    全て同じ値になることと、整数から直接計算した値と一致することを確かめる。
+    '''
+    byte2data = SerialByte2Data(["uint8", fp_format, fp_format], endian)
+    vd = byte2data.data_array[1]
+    rng = np.random.default_rng(0)
+    frames = rng.integers(0, 256, size=(200, byte2data.frame_size), dtype=np.uint8)
+    records = byte2data.frames2array(frames.tobytes())
+    byteorder = endian_byteorder(endian)
+    for k, frame in enumerate(frames.tobytes()[i:i + byte2data.frame_size]
+                              for i in range(0, frames.size, byte2data.frame_size)):
+        byte2data.reset_translate()
+        per_byte = [byte2data.byte2data(bytes([b])) for b in frame]
+        per_byte = tuple(v for v in per_byte if v != None)
+        unpacked = byte2data.unpack_frame(frame)
+        assert per_byte == unpacked
+        assert tuple(records[k].tolist()) == unpacked
+        for j in range(0, 2):
+            start = 1 + j * vd.bytes_length
+            raw = int.from_bytes(frame[start:start + vd.bytes_length], byteorder=byteorder) & ((1 << vd.fp_word) - 1)
+            if vd.fp_signed and raw >= 1 << (vd.fp_word - 1):
+                raw -= 1 << vd.fp_word
+            assert unpacked[1 + j] == raw * 2.0 ** -vd.fp_fraction
@@ -0,0 +1,56 @@
+import os
+import time
+import numpy as np
+import pytest
+from benchmark.stream_generator import encode_frames
+from serial_acquisition.multi_port_acquisition import MultiPortAcquisition, SerialPortConfig
+from serial_processor.serial_byte2data import VariousDataEndian
+from serial_recorder.raw_recorder import replay_file
+
+# 疑似端末はWindowsでは使えない
+pty = pytest.importorskip("pty")
+
+
+def test_merge_two_ports(tmp_path) -> None:
+    '''
+    2つの疑似端末から500フレームずつ送り、破棄されずに受信時刻順の1つの時系列にまとめられることと、
+    ポート毎に生データが記録されることを確かめる。
+    '''
+    data_format = ["uint32", "float"]
+    pairs = [pty.openpty() for i in range(2)]
+    acquisition = MultiPortAcquisition([SerialPortConfig(os.ttyname(slave), 115200, data_format,
+                                                         endian=VariousDataEndian.LITTLEENDIAN)
+                                        for master, slave in pairs], record_path=str(tmp_path / "raw"))
+    acquisition.start()
+    try:
+        # ワーカープロセスがポートを開くのを待つ（開く前に送ったデータは破棄される）
+        deadline = time.time() + 10.0
+        while not acquisition.opened() and time.time() < deadline:
+            time.sleep(0.01)
+        assert acquisition.opened()
+        values = np.empty(500, dtype=[("f0", "<u4"), ("f1", "<f4")])
+        for i, (master, slave) in enumerate(pairs):
+            values["f0"] = np.arange(500)
+            values["f1"] = i
+            os.write(master, b"".join(encode_frames(data_format, values, VariousDataEndian.LITTLEENDIAN)))
+        merged: list[np.ndarray] = []
+        deadline = time.time() + 5.0
+        while sum(len(rows) for rows in merged) < 1000 and time.time() < deadline:
+            merged.append(acquisition.merge())
+            time.sleep(0.05)
+        rows = np.concatenate(merged)
+        assert acquisition.stats()["dropped_rows"] == 0
+    finally:
+        acquisition.stop()
+        for master, slave in pairs:
+            os.close(master)
+            os.close(slave)
+    for i in range(0, 2):
+        port_rows = rows[rows[:, 1] == i]
+        assert np.all(np.diff(port_rows[:, 0]) >= 0)
+        np.testing.assert_array_equal(port_rows[:, 2], np.arange(500))
+        np.testing.assert_array_equal(port_rows[:, 3], i)
+    for i in range(0, 2):
+        replayed = replay_file(str(tmp_path / "raw.port{}".format(i)))
+        np.testing.assert_array_equal(replayed[:, 0], np.arange(500))
+        np.testing.assert_array_equal(replayed[:, 1], i)
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+from benchmark.stream_generator import generate_stream
+from serial_processor.serial_byte2data import VariousDataEndian
+from serial_processor.serial_raw2array_pipeline import SerialRaw2ArrayPipeline
+
+
+@pytest.mark.parametrize("checksum", [None, "sum8", "xor8", "crc16", "crc32"])
+@pytest.mark.parametrize("endian", [VariousDataEndian.BIGENDIAN, VariousDataEndian.LITTLEENDIAN])
+def test_damaged_stream_never_misaligns(checksum: str | None, endian: VariousDataEndian) -> None:
+    '''
+    フレームの間にランダムなバイト列を挟み、フレーム内のバイトを書き換えたストリームを乱数の大きさのチャンクに分けて入力し、
+    出力した各サンプルが送信したサンプルのいずれかと順に一致する（破棄はしても値をずらさない）ことを確かめる。
+    チェックサムが無い場合は書き換えたフレームを検出できないため、ランダムなバイト列のみを挟む。
+    '''
+    data_format = ["uint16", "float", "int32", "double"]
+    stream, values = generate_stream(data_format, 3000, endian=endian, junk_rate=0.1,
+                                     corrupt_rate=0.0 if checksum == None else 0.1, seed=1, checksum=checksum)
+    pipeline = SerialRaw2ArrayPipeline(data_format, endian=endian, checksum=checksum)
+    rng = np.random.default_rng(2)
+    bounds = np.sort(rng.integers(0, len(stream), size=300))
+    records = [pipeline.read_chunk_records(stream[start:end])
+               for start, end in zip(np.concatenate([[0], bounds]), np.concatenate([bounds, [len(stream)]]))]
+    output = np.concatenate(records).tolist()
+    source = values.tolist()
+
+    i = 0
+    for row in output:
+        while i < len(source) and source[i] != row:
+            i += 1
+        assert i < len(source), "sample not found in order: {}".format(row)
+        i += 1
+    # 壊れたフレームを除き、大半のサンプルを受信できる
+    assert len(output) > 0.8 * len(source)
+    if checksum != None:
+        assert pipeline.dropped_frame_count > 0
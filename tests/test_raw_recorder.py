@@ -0,0 +1,33 @@
+import numpy as np
+from benchmark.stream_generator import generate_stream
+from serial_processor.serial_byte2data import VariousDataEndian
+from serial_processor.serial_raw2array_pipeline import SerialRaw2ArrayPipeline
+from serial_recorder.raw_recorder import RawRecorder, RawReplaySource, replay_file
+
+
+def test_record_and_replay_round_trip(tmp_path) -> None:
+    '''
+    ビッグエンディアンで固定小数点型とチェックサムを含むストリームをチャンク毎に記録して再生し、
+    記録した設定でデコードした値が、記録せずにデコードした値と一致することを確かめる。
+    '''
+    data_format = ["int16", "fp24q12", "ufp12q4", "float"]
+    endian = VariousDataEndian.BIGENDIAN
+    stream, values = generate_stream(data_format, 2000, endian=endian, seed=3, checksum="crc16")
+    path = str(tmp_path / "capture.raw")
+    with RawRecorder(path, data_format, endian=endian, checksum="crc16") as recorder:
+        for i in range(0, len(stream), 333):
+            recorder.write(memoryview(stream)[i:i + 333])
+    assert recorder.recorded_byte_count == len(stream)
+
+    source = RawReplaySource(path)
+    try:
+        assert source.data_format == data_format
+        assert source.endian == endian
+        assert source.mode == "bin"
+    finally:
+        source.close()
+    replayed = replay_file(path, chunk_size=1000)
+    expected = SerialRaw2ArrayPipeline(data_format, endian=endian, checksum="crc16").read_chunk_array(stream)
+    assert len(replayed) == len(values)
+    np.testing.assert_array_equal(replayed, expected)
+    np.testing.assert_array_equal(replayed[:, 0], values["f0"])
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+from serial_plotter.ring_buffer import RingBuffer
+
+
+@pytest.mark.parametrize("capacity, block_size", [(1, 1), (100, 16), (1000, 64), (257, 1024)])
+def test_view_and_min_max_match_concatenation(capacity: int, block_size: int) -> None:
+    '''
+    push()と乱数の大きさのextend()（capacity以上を含む）を混ぜて追加し、
+    view()とmin_max()が全てのサンプルを連結した配列の末尾capacity行と一致することを確かめる。
+    '''
+    rng = np.random.default_rng(capacity)
+    buffer = RingBuffer(capacity, 3, block_size=block_size)
+    added: list[np.ndarray] = []
+    for i in range(0, 300):
+        if rng.random() < 0.3:
+            row = rng.normal(size=3)
+            buffer.push(row)
+            added.append(row[np.newaxis])
+        else:
+            rows = rng.normal(size=(int(rng.choice([0, 1, 5, capacity - 1, capacity, capacity + 3, 40])), 3))
+            buffer.extend(rows)
+            added.append(rows)
+        expected = np.concatenate(added)[-capacity:]
+        assert len(buffer) == len(expected)
+        assert buffer.total_count == sum(len(rows) for rows in added)
+        np.testing.assert_array_equal(buffer.view(), expected.T)
+        if len(expected) > 0:
+            col_min, col_max = buffer.min_max()
+            np.testing.assert_array_equal(col_min, expected.min(axis=0))
+            np.testing.assert_array_equal(col_max, expected.max(axis=0))
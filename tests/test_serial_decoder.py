@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from serial_processor.serial_decoder import SerialDecoder, SerialDecoderState
+
+
+def decode_per_byte(decoder: SerialDecoder, data: bytes, frame: bytearray) -> list[bytes]:
+    '''
+    decode()に1バイトずつ入力し、完成したフレームの配列を返す。受信途中のフレームはframeに持ち越す。
+    '''
+    frames: list[bytes] = []
+    for b in data:
+        state, value = decoder.decode(bytes([b]))
+        if state == SerialDecoderState.START:
+            frame.clear()
+        elif state == SerialDecoderState.RUNNING and value != None:
+            frame += value
+        elif state == SerialDecoderState.FINISH:
+            frames.append(bytes(frame))
+            frame.clear()
+    return frames
+
+
+@pytest.mark.parametrize("seed", range(0, 20))
+def test_decode_buffer_matches_decode(seed: int) -> None:
+    '''
+    制御文字を多く含む乱数のバイト列を乱数の大きさのチャンクに分けて入力し、
+    decode_buffer()がdecode()に1バイトずつ入力した場合と同じフレーム、ステート、計測値になることを確かめる。
+    '''
+    rng = np.random.default_rng(seed)
+    data = bytes(rng.choice([0x10, 0x02, 0x03, 0x10, 0x41, 0xff], size=5000).astype(np.uint8))
+    bounds = np.sort(rng.integers(0, len(data), size=rng.integers(1, 200)))
+    reference = SerialDecoder()
+    decoder = SerialDecoder()
+    frame = bytearray()
+    for chunk in np.split(np.frombuffer(data, dtype=np.uint8), bounds):
+        expected = decode_per_byte(reference, chunk.tobytes(), frame)
+        assert decoder.decode_buffer(memoryview(chunk.tobytes())) == expected
+        assert decoder.state == reference.state
+        assert decoder.had_dle == reference.had_dle
+    assert decoder.frame_count == reference.frame_count
+    assert decoder.protocol_error_count == reference.protocol_error_count
+    assert decoder.input_byte_count == reference.input_byte_count
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+from serial_analysis.stft_engine import StftEngine, make_window
+
+
+@pytest.mark.parametrize("window_size, hop", [(64, 16), (128, 128), (100, 33)])
+def test_incremental_push_matches_direct_rfft(window_size: int, hop: int) -> None:
+    '''
+    不揃いな大きさに分けて入力したスペクトルが、hop毎に窓を掛けて直接rfftした値と一致することを確かめる。
+    '''
+    rng = np.random.default_rng(window_size)
+    samples = np.sin(np.arange(5000) * 0.3) + rng.normal(0, 0.1, 5000)
+    engine = StftEngine(window_size, hop, window="hann", max_batch_frames=4, db=False)
+    sizes = rng.choice([1, 3, hop, window_size + 1, 700], size=len(samples))
+    bounds = np.cumsum(sizes)
+    bounds = bounds[bounds < len(samples)]
+    spectra = np.concatenate([engine.push(piece) for piece in np.split(samples, bounds)])
+
+    window = make_window("hann", window_size)
+    starts = range(0, len(samples) - window_size + 1, hop)
+    expected = np.array([np.abs(np.fft.rfft(samples[s:s + window_size] * window)) for s in starts])
+    expected *= 2.0 / window.sum()
+    assert engine.frame_count == len(expected)
+    np.testing.assert_allclose(spectra, expected, rtol=1e-10, atol=1e-12)
@@ -0,0 +1,78 @@
+import asyncio
+import socket
+import threading
+import time
+import numpy as np
+import pytest
+from serial_server.stream_client import SampleStreamClient
+from serial_server.stream_server import SampleStreamServer
+
+BLOCK_COUNT: int = 200
+BLOCK_ROWS: int = 1000
+
+
+class PacedSource:
+    '''
+    start()が呼ばれた後、drain()毎に1つのバッチを返す入力元。全て返した後はfinishedをTrueにする。
+    '''
+
+    def __init__(self) -> None:
+        self.batches: list[np.ndarray] = [
+            np.full((BLOCK_ROWS, 3), i, dtype=np.float64) for i in range(0, BLOCK_COUNT)]
+        self.started = threading.Event()
+        self.finished: bool = False
+
+    def drain(self, max_batches: int | None = None) -> list[np.ndarray]:
+        if not self.started.is_set() or len(self.batches) == 0:
+            return []
+        batch = self.batches.pop(0)
+        if len(self.batches) == 0:
+            self.finished = True
+        return [batch]
+
+
+def wait_until(condition, timeout: float = 10.0) -> None:
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    assert condition()
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="Unix domain sockets are not available.")
+@pytest.mark.parametrize("slow_client", ["drop", "disconnect"])
+def test_stalled_client_does_not_block_others(tmp_path, slow_client: str) -> None:
+    '''
+    受信しないクライアントと通常のクライアントを接続して配信し、
+    通常のクライアントは接続後に配信された全てのブロックを受信し、受信しないクライアントの分は破棄・切断されることを確かめる。
+    '''
+    address = "unix:{}".format(tmp_path / "server.sock")
+    source = PacedSource()
+    server = SampleStreamServer(source, address, ["time", "f0", "f1"], ["double", "double"], max_client_blocks=4,
+                                slow_client=slow_client, write_buffer_size=1 << 12)
+    thread = threading.Thread(target=lambda: asyncio.run(server.serve()), daemon=True)
+    thread.start()
+    wait_until(lambda: (tmp_path / "server.sock").exists())
+
+    stalled = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stalled.connect(str(tmp_path / "server.sock"))
+    client = SampleStreamClient(address)
+    client.start()
+    try:
+        wait_until(lambda: server.stats()["clients"] == 2)
+        source.started.set()
+        thread.join(30.0)
+        assert not thread.is_alive()
+        wait_until(lambda: client.finished)
+        rows = np.concatenate(client.drain())
+    finally:
+        client.stop()
+        stalled.close()
+
+    assert client.stats()["server_dropped_samples"] == 0
+    assert client.stats()["dropped_samples"] == 0
+    np.testing.assert_array_equal(rows[:, 0], np.repeat(np.arange(BLOCK_COUNT), BLOCK_ROWS))
+    if slow_client == "drop":
+        assert server.stats()["dropped_blocks"] > 0
+        assert server.stats()["disconnected_clients"] == 0
+    else:
+        assert server.stats()["disconnected_clients"] == 1
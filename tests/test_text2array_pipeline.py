@@ -0,0 +1,23 @@
+import numpy as np
+from serial_processor.serial_text2array_pipeline import SerialText2ArrayPipeline
+
+
+def test_malformed_lines_do_not_compensate() -> None:
+    '''
+    列数の過不足が別の行と打ち消し合う不正な行が、値をずらして変換されずに破棄されることを確かめる。
+    '''
+    pipeline = SerialText2ArrayPipeline(2)
+    values = pipeline.read_chunk_array(b"1 2,3\n4,\n5,6\n")
+    np.testing.assert_array_equal(values, [[5, 6]])
+    assert pipeline.malformed_line_count == 2
+
+
+def test_lines_across_chunks() -> None:
+    '''
+    チャンクの境界で分かれた行と空行、CRLFを含むテキストが行毎に変換されることを確かめる。
+    '''
+    pipeline = SerialText2ArrayPipeline(3)
+    text = b"1,2,3\r\n\n4.5,-6,7e1\n8,9,10\n"
+    values = np.concatenate([pipeline.read_chunk_array(text[i:i + 4]) for i in range(0, len(text), 4)])
+    np.testing.assert_array_equal(values, [[1, 2, 3], [4.5, -6, 70], [8, 9, 10]])
+    assert pipeline.malformed_line_count == 0
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from serial_analysis.trigger_engine import TriggerEngine
+
+PRE: int = 30
+POST: int = 50
+
+
+def square_wave() -> np.ndarray:
+    '''
+    [通し番号, 値]の行を返す。値は100サンプル毎に-1と1を繰り返し、立ち上がりの直後にレベル付近で往復する雑音を含む。
+    '''
+    n = 2000
+    value = np.where((np.arange(n) // 100) % 2 == 0, -1.0, 1.0)
+    edges = np.arange(100, n, 200)
+    value[edges + 1] = -0.1
+    value[edges + 2] = 0.1
+    return np.column_stack([np.arange(n, dtype=np.float64), value])
+
+
+def run(rows: np.ndarray, batch_size: int, **kwargs) -> tuple[TriggerEngine, list]:
+    trigger = TriggerEngine(2, 1, 0.0, pre_samples=PRE, post_samples=POST, **kwargs)
+    captures = []
+    for i in range(0, len(rows), batch_size):
+        captures += trigger.push(rows[i:i + batch_size])
+    return trigger, captures
+
+
+@pytest.mark.parametrize("batch_size", [1, 7, 100, 2000])
+def test_captures_do_not_depend_on_batch_size(batch_size: int) -> None:
+    '''
+    同じ矩形波をバッチの大きさを変えて入力し、トリガー位置と切り出したサンプルが常に同じになることを確かめる。
+    ヒステリシスにより、立ち上がり直後の雑音では再びトリガーしない。
+    '''
+    rows = square_wave()
+    trigger, captures = run(rows, batch_size, hysteresis=0.2)
+    assert [c.trigger_index for c in captures] == list(range(100, 2000, 200))
+    for capture in captures:
+        i = capture.trigger_index
+        np.testing.assert_array_equal(capture.rows, rows[i - PRE:i + POST])
+    assert trigger.trigger_count == len(captures)
+    assert trigger.ignored_trigger_count == 0
+
+
+@pytest.mark.parametrize("batch_size", [1, 7, 100, 2000])
+def test_hysteresis_and_holdoff(batch_size: int) -> None:
+    '''
+    ヒステリシスが無い場合は雑音でもトリガーするが切り出し中は無視し、ホールドオフ中のトリガーも無視することを確かめる。
+    '''
+    rows = square_wave()
+    trigger, captures = run(rows, batch_size)
+    assert [c.trigger_index for c in captures] == list(range(100, 2000, 200))
+    assert trigger.trigger_count == 2 * len(captures)
+    assert trigger.ignored_trigger_count == len(captures)
+
+    trigger, captures = run(rows, batch_size, hysteresis=0.2, holdoff=250)
+    assert [c.trigger_index for c in captures] == list(range(100, 2000, 400))
+    assert trigger.ignored_trigger_count == 5
@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+from serial_plotter.x_axis import XAxisMode, XAxisSelector
+
+
+@pytest.mark.parametrize("batch_size", [1, 7, 1000, 20000])
+def test_uint16_counter_unwraps_across_batches(batch_size: int) -> None:
+    '''
+    uint16のティックが何度も0に戻る列を、バッチの境界で桁あふれする大きさに分けて入力し、
+    連続した単調増加の横軸になることを確かめる。
+    '''
+    rng = np.random.default_rng(batch_size)
+    ticks = np.cumsum(rng.integers(1, 3000, size=20000))
+    values = np.column_stack([ticks % 65536, rng.normal(size=len(ticks))]).astype(np.float64)
+    selector = XAxisSelector(XAxisMode.FIELD, 0, wrap_bits=16, scale=0.5)
+    x = np.concatenate([selector.make_x(values[i:i + batch_size]) for i in range(0, len(values), batch_size)])
+    np.testing.assert_array_equal(x, (ticks - ticks[0] + values[0, 0]) * 0.5)
+    assert selector.non_monotonic_count == 0